@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import RevokedToken
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ['jti', 'revoked_at', 'expires_at']
+    search_fields = ['jti']
+    readonly_fields = ['jti', 'revoked_at', 'expires_at']
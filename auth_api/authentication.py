@@ -0,0 +1,100 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+
+USER_STATE_FIELDS = ('username', 'email', 'first_name', 'last_name', 'date_joined', 'is_active', 'is_staff')
+
+
+def user_state_cache_key(user_id):
+    return f'auth:user_state:{user_id}'
+
+
+def get_user_state(user_id):
+    """Cached account state for a user id, or None if the user does not exist"""
+    key = user_state_cache_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = User.objects.filter(id=user_id).values(*USER_STATE_FIELDS).first() or {}
+        cache.set(key, state, getattr(settings, 'AUTH_USER_STATE_CACHE_TTL', 60))
+    return state or None
+
+
+def invalidate_user_state(user_id):
+    cache.delete(user_state_cache_key(user_id))
+
+
+class ClaimsUser(TokenUser):
+    """Request user built from token claims plus cached account state; never a model instance"""
+
+    def __init__(self, token, state):
+        super().__init__(token)
+        self.state = state
+
+    @property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @property
+    def username(self):
+        return self.token.get('username') or self.state['username']
+
+    @property
+    def is_staff(self):
+        return self.state['is_staff']
+
+    @property
+    def is_active(self):
+        return self.state['is_active']
+
+    def __getattr__(self, attr):
+        if attr in USER_STATE_FIELDS:
+            return self.state[attr]
+        return super().__getattr__(attr)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWT authentication that resolves the user from claims and a short-lived cache instead of the DB
+
+    Deactivating or deleting a user takes effect once their cached state expires
+    (AUTH_USER_STATE_CACHE_TTL), or immediately in processes sharing the cache.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        state = get_user_state(validated_token[api_settings.USER_ID_CLAIM])
+        if state is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if not state['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return ClaimsUser(validated_token, state)
+
+
+async def aauthenticate_request(request):
+    """Resolve the caller of a plain async Django view from a Bearer token, falling back to the session
+
+    Returns None for anonymous callers. An invalid or expired token raises
+    AuthenticationFailed, as in DRF views; see authentication_failed_response().
+    """
+    result = await sync_to_async(ClaimsJWTAuthentication().authenticate)(request)
+    if result is not None:
+        return result[0]
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def authentication_failed_response(request, exc):
+    """The 401 DRF's exception handler would send for exc"""
+    response = JsonResponse(exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail},
+                            status=exc.status_code)
+    response['WWW-Authenticate'] = ClaimsJWTAuthentication().authenticate_header(request)
+    return response
@@ -0,0 +1,87 @@
+import statistics
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import get_hashers
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from storebuilder.benchmarking import percentile
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def count_hashes():
+    """Count password hash computations (encode calls) across every configured hasher"""
+    counter = {'hashes': 0}
+    patched = []
+    for hasher in get_hashers():
+        original = hasher.encode
+
+        def encode(*args, _original=original, **kwargs):
+            counter['hashes'] += 1
+            return _original(*args, **kwargs)
+
+        hasher.encode = encode
+        patched.append(hasher)
+    try:
+        yield counter
+    finally:
+        for hasher in patched:
+            del hasher.encode
+
+
+class Command(BaseCommand):
+    help = 'Compare login, token and register endpoints on password hashes per request and latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Requests per endpoint')
+
+    def handle(self, *args, **options):
+        # Everything runs in a transaction that is rolled back, so the database is left untouched
+        try:
+            with transaction.atomic(), override_settings(RATE_LIMIT_ENABLED=False):
+                self.run(options['requests'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def run(self, count):
+        password = uuid.uuid4().hex
+        user = User.objects.create_user(f'bench_{uuid.uuid4().hex[:12]}', password=password)
+        client = APIClient()
+        credentials = {'username': user.username, 'password': password}
+
+        def register_payload():
+            name = f'bench_{uuid.uuid4().hex[:12]}'
+            return {'username': name, 'email': f'{name}@example.com',
+                    'password': password, 'password_confirm': password}
+
+        scenarios = [
+            ('login', '/api/auth/login/', lambda: credentials, 200),
+            ('token', '/api/auth/token/', lambda: credentials, 200),
+            ('register', '/api/auth/register/', register_payload, 201),
+        ]
+
+        self.stdout.write(f'{"endpoint":<10}{"hashes/req":>12}{"p50 ms":>10}{"p95 ms":>10}{"max ms":>10}')
+        for name, url, payload, expected in scenarios:
+            timings = []
+            with count_hashes() as counter:
+                for _ in range(count):
+                    data = payload()
+                    start = time.perf_counter()
+                    response = client.post(url, data, format='json', secure=True)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    if response.status_code != expected:
+                        self.stderr.write(f'{name}: unexpected status {response.status_code}')
+            self.stdout.write(
+                f'{name:<10}{counter["hashes"] / count:>12.2f}{statistics.median(timings):>10.1f}'
+                f'{percentile(timings, 95):>10.1f}{max(timings):>10.1f}'
+            )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from auth_api.revocation import prune_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete revoked refresh tokens that have already expired'
+
+    def handle(self, *args, **options):
+        deleted = prune_expired()
+        self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} expired revoked token(s)'))
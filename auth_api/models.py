@@ -1,3 +1,14 @@
 from django.db import models
 
-# Create your models here.
+
+class RevokedToken(models.Model):
+    """Refresh token revoked by logout or rotation; the source of truth for revocation checks"""
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Revoked token {self.jti}"
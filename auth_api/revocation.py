@@ -0,0 +1,107 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import RevokedToken
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings; no false negatives, tunable false positives"""
+
+    def __init__(self, bits, hashes):
+        self.bits = bits
+        self.hashes = hashes
+        self.array = bytearray((bits + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, value):
+        for pos in self._positions(value):
+            self.array[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, value):
+        return all(self.array[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class RevocationStore:
+    """Revoked refresh-token jtis backed by RevokedToken, fronted by a per-process bloom filter and LRU
+
+    Lookups for tokens that were never revoked are answered from memory. Revocations
+    made by other processes are picked up within TOKEN_REVOCATION_SYNC_SECONDS by
+    loading only rows newer than the last one seen; the filter is rebuilt from the
+    table (dropping expired entries) every TOKEN_REVOCATION_REBUILD_SECONDS.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.seen_id = 0
+        self.synced_at = 0
+        self.rebuilt_at = 0
+        self.recent = OrderedDict()
+
+    def _remember(self, jti, revoked):
+        self.recent[jti] = revoked
+        self.recent.move_to_end(jti)
+        while len(self.recent) > getattr(settings, 'TOKEN_REVOCATION_LRU_SIZE', 4096):
+            self.recent.popitem(last=False)
+
+    def _load(self, rows):
+        for row_id, jti in rows:
+            self.bloom.add(jti)
+            self.recent.pop(jti, None)
+            self.seen_id = max(self.seen_id, row_id)
+
+    def _sync(self):
+        now = time.monotonic()
+        if self.bloom is None or now - self.rebuilt_at >= getattr(settings, 'TOKEN_REVOCATION_REBUILD_SECONDS', 3600):
+            prune_expired()
+            self.bloom = BloomFilter(
+                getattr(settings, 'TOKEN_REVOCATION_BLOOM_BITS', 1 << 20),
+                getattr(settings, 'TOKEN_REVOCATION_BLOOM_HASHES', 7),
+            )
+            self.seen_id = 0
+            self.recent.clear()
+            self._load(RevokedToken.objects.values_list('id', 'jti').iterator())
+            self.rebuilt_at = self.synced_at = now
+        elif now - self.synced_at >= getattr(settings, 'TOKEN_REVOCATION_SYNC_SECONDS', 5):
+            self._load(RevokedToken.objects.filter(id__gt=self.seen_id).values_list('id', 'jti'))
+            self.synced_at = now
+
+    def revoke(self, jti, expires_at):
+        RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+            self._remember(jti, True)
+
+    def is_revoked(self, jti):
+        with self.lock:
+            self._sync()
+            if jti not in self.bloom:
+                return False
+            if jti in self.recent:
+                self.recent.move_to_end(jti)
+                return self.recent[jti]
+        # Possible hit (or bloom false positive): confirm against the table
+        revoked = RevokedToken.objects.filter(jti=jti).exists()
+        with self.lock:
+            self._remember(jti, revoked)
+        return revoked
+
+
+def prune_expired():
+    """Delete revocations for tokens that have expired anyway, returning how many were removed"""
+    deleted, _ = RevokedToken.objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
+
+
+revocation_store = RevocationStore()
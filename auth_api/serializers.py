@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from .tokens import UserClaimsRefreshToken
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -45,4 +47,19 @@ class UserLoginSerializer(serializers.Serializer):
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'date_joined')
\ No newline at end of file
+        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'date_joined')
+
+
+class UserClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = UserClaimsRefreshToken
+    
+    def validate(self, attrs):
+        # self.user is set by the single authenticate() call in the parent
+        data = super().validate(attrs)
+        data['user'] = UserSerializer(self.user).data
+        return data
+
+
+
+class UserClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = UserClaimsRefreshToken
@@ -1,3 +1,7 @@
 from django.test import TestCase
 
-# Create your tests here.
+from storebuilder.query_budgets import QueryBudgetTestMixin
+
+
+class AuthQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    budget_urlconfs = ('auth_api.urls',)
@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .revocation import revocation_store
+
+
+class UserClaimsRefreshToken(RefreshToken):
+    """Refresh token carrying the claims needed to build a request user without a DB lookup
+
+    Revocation (logout, rotation) is recorded in the RevokedToken store rather than
+    simplejwt's token_blacklist app, so issuing a token never writes to the DB.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['username'] = user.username
+        token['is_active'] = user.is_active
+        token['is_staff'] = user.is_staff
+        return token
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if revocation_store.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+    def blacklist(self):
+        expires_at = datetime.fromtimestamp(self.payload['exp'], tz=timezone.utc)
+        revocation_store.revoke(self.payload[api_settings.JTI_CLAIM], expires_at)
@@ -2,20 +2,19 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.contrib.auth.models import User
 from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserSerializer
+from .tokens import UserClaimsRefreshToken
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register(request):
-    print(request)
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = UserClaimsRefreshToken.for_user(user)
         return Response({
             'user': UserSerializer(user).data,
             'refresh': str(refresh),
@@ -30,7 +29,7 @@ def login(request):
     serializer = UserLoginSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
+        refresh = UserClaimsRefreshToken.for_user(user)
         return Response({
             'user': UserSerializer(user).data,
             'refresh': str(refresh),
@@ -43,7 +42,7 @@ def login(request):
 def logout(request):
     try:
         refresh_token = request.data["refresh"]
-        token = RefreshToken(refresh_token)
+        token = UserClaimsRefreshToken(refresh_token)
         token.blacklist()
         return Response({'message': 'Successfully logged out'}, status=status.HTTP_200_OK)
     except Exception:
@@ -57,14 +56,8 @@ def profile(request):
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
-    def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)
-        if response.status_code == 200:
-            serializer = UserLoginSerializer(data=request.data)
-            if serializer.is_valid():
-                user = serializer.validated_data['user']
-                response.data['user'] = UserSerializer(user).data
-        return response
+    # UserClaimsTokenObtainPairSerializer adds the user payload from its own authentication
+    pass
 
 
 class CustomTokenRefreshView(TokenRefreshView):
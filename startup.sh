@@ -1,10 +1,14 @@
 #!/usr/bin/env sh
 set -e
 cd /app
-python3 manage.py collectstatic --noinput
+# FAST_STARTUP (default) collects static files inside the preloaded gunicorn
+# master, skipping it when nothing changed; see storebuilder/gunicorn_conf.py
+if [ "${FAST_STARTUP:-True}" != "True" ]; then
+  python3 manage.py collectstatic --noinput
+fi
 # Optional: [ "$RUN_MIGRATIONS" = "1" ] && python3 manage.py migrate --noinput
-exec gunicorn storebuilder.wsgi:application \
-  --bind 0.0.0.0:${PORT:-8080} \
-  --workers ${WEB_CONCURRENCY:-3} \
-  --timeout 120 \
-  --access-logfile - --error-logfile -
+# Workers share /metrics samples through files here; stale ones from a previous run would be summed in
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus-multiproc}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+# Worker class, sizing, timeouts and recycling: see storebuilder/gunicorn_conf.py
+exec gunicorn --config python:storebuilder.gunicorn_conf
@@ -0,0 +1,7 @@
+"""Helpers shared by the benchmark and load test management commands."""
+
+
+def percentile(samples, pct):
+    """Nearest-rank pct-th percentile of a non-empty list of samples"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
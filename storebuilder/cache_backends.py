@@ -0,0 +1,60 @@
+"""
+Django's cache backends with hit/miss counting for ``/metrics``.
+
+Only reads are counted: ``get``, ``get_many`` and their async versions, which
+Django implements on top of them. Each read is labelled with the cache use its
+key belongs to (``CACHE_USES``), so a hit ratio means something per use rather
+than mixing response bodies with rate-limit counters.
+"""
+import threading
+
+from django.core.cache.backends import locmem, redis
+
+from .metrics import CACHE_REQUESTS
+
+
+_MISSING = object()
+
+# Key prefix -> use label; first match wins
+CACHE_USES = (
+    ('rc:tag:', 'response_cache_tags'),
+    ('rc:', 'response_cache'),
+    ('rl:', 'rate_limit'),
+    ('auth:user_state:', 'user_state'),
+    ('db:sticky:', 'read_your_writes'),
+    ('django.contrib.sessions.cache', 'sessions'),
+)
+
+
+def cache_use(key):
+    return next((use for prefix, use in CACHE_USES if key.startswith(prefix)), 'other')
+
+
+class CacheMetricsMixin:
+    # LocMemCache.get_many() is BaseCache's, which calls get() per key
+    _counting = threading.local()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if not getattr(self._counting, 'many', False):
+            CACHE_REQUESTS.labels(cache_use(key), 'miss' if value is _MISSING else 'hit').inc()
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        self._counting.many = True
+        try:
+            found = super().get_many(keys, version)
+        finally:
+            self._counting.many = False
+        for key in keys:
+            CACHE_REQUESTS.labels(cache_use(key), 'hit' if key in found else 'miss').inc()
+        return found
+
+
+class LocMemCache(CacheMetricsMixin, locmem.LocMemCache):
+    pass
+
+
+class RedisCache(CacheMetricsMixin, redis.RedisCache):
+    pass
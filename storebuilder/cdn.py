@@ -0,0 +1,150 @@
+"""
+Edge caching for the public catalog endpoints.
+
+``CDNCacheMiddleware`` gives successful GET/HEAD responses of the views in
+``CDN_CACHE_POLICIES`` a ``Cache-Control`` that lets a CDN keep them
+(``s-maxage``, ``stale-while-revalidate``) while browsers revalidate, plus a
+``Surrogate-Key`` header naming what the response depends on: its
+``CACHE_TAGS``, e.g. ``store-3`` or ``products``, formatted from the URL kwargs
+so the same policy covers the DRF views and their async versions.
+
+When a Product or Store changes, ``stores.signals`` calls ``schedule_purge``
+with the affected keys; they are purged through ``CDN_PURGE_CLIENT`` once the
+transaction commits, coalesced into one call. ``LocalPurgeClient`` (the
+default) only records the keys, for development and tests.
+"""
+import json
+import logging
+import threading
+import urllib.request
+from collections import deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.utils.module_loading import import_string
+
+from .routing import resolve_request
+
+
+logger = logging.getLogger('storebuilder.cdn')
+
+
+class LocalPurgeClient:
+    """Records purged keys in memory instead of calling a CDN"""
+
+    def __init__(self):
+        self.purged = deque(maxlen=1000)
+
+    def purge(self, keys):
+        self.purged.append(frozenset(keys))
+        logger.debug('purge %s', ' '.join(sorted(keys)))
+
+
+class FastlyPurgeClient:
+    """Soft-purges surrogate keys through the Fastly API, so stale copies keep serving while refetched"""
+
+    URL = 'https://api.fastly.com/service/{service_id}/purge'
+    BATCH = 256
+
+    def __init__(self):
+        self.url = self.URL.format(service_id=settings.CDN_FASTLY_SERVICE_ID)
+        self.token = settings.CDN_FASTLY_API_TOKEN
+
+    def purge(self, keys):
+        keys = sorted(keys)
+        for i in range(0, len(keys), self.BATCH):
+            body = json.dumps({'surrogate_keys': keys[i:i + self.BATCH]}).encode()
+            request = urllib.request.Request(self.url, data=body, method='POST', headers={
+                'Content-Type': 'application/json',
+                'Fastly-Key': self.token,
+                'Fastly-Soft-Purge': '1',
+            })
+            with urllib.request.urlopen(request, timeout=10):
+                pass
+
+
+_client = None
+
+
+def get_purge_client():
+    global _client
+    if _client is None:
+        _client = import_string(getattr(settings, 'CDN_PURGE_CLIENT', 'storebuilder.cdn.LocalPurgeClient'))()
+    return _client
+
+
+_pending = threading.local()
+
+
+def _flush():
+    keys = getattr(_pending, 'keys', None)
+    if not keys:
+        return
+    _pending.keys = set()
+    try:
+        get_purge_client().purge(keys)
+    except Exception:
+        # The edge copies expire on their own; a failed purge must not fail the write
+        logger.exception('CDN purge of %s failed', ' '.join(sorted(keys)))
+
+
+def schedule_purge(keys):
+    """Purge keys after the current transaction commits (immediately outside one)"""
+    if not getattr(settings, 'CDN_CACHE_ENABLED', True):
+        return
+    if not hasattr(_pending, 'keys'):
+        _pending.keys = set()
+    # Every change in a transaction lands in the same set and the first callback purges it all;
+    # keys left over from a rolled-back transaction just go out with the next purge
+    _pending.keys.update(keys)
+    transaction.on_commit(_flush)
+
+
+class CDNCacheMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CDN_CACHE_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return response
+        # Leave explicit policies alone, and never share a response that sets cookies
+        if response.has_header('Cache-Control') or response.cookies:
+            return response
+        match = resolve_request(request)
+        policy = settings.CDN_CACHE_POLICIES.get(match.url_name) if match is not None else None
+        if policy is None:
+            return response
+
+        # DRF's session authentication touches the session of anonymous visitors, which adds
+        # Vary: Cookie; these views render the same for everyone, and a CDN won't share a copy that varies on it
+        if response.has_header('Vary'):
+            vary = [field.strip() for field in response['Vary'].split(',') if field.strip().lower() != 'cookie']
+            if vary:
+                response.headers['Vary'] = ', '.join(vary)
+            else:
+                del response.headers['Vary']
+        patch_cache_control(response, public=True, max_age=policy.get('max_age', 0), s_maxage=policy['s_maxage'],
+                            stale_while_revalidate=policy.get('stale_while_revalidate', 0))
+        keys = [tag.format(**match.kwargs) for tag in settings.CACHE_TAGS.get(match.url_name, ())]
+        if keys:
+            response.headers[settings.CDN_SURROGATE_KEY_HEADER] = ' '.join(keys)
+        return response
@@ -0,0 +1,202 @@
+"""
+gzip/brotli response compression.
+
+``CompressionMiddleware`` compresses responses whose content type is in
+``COMPRESSION_CONTENT_TYPES`` and whose body is at least
+``COMPRESSION_MIN_SIZE`` bytes, using brotli when the ``brotli`` package is
+installed and the client accepts it, else gzip. Streaming responses (order
+exports) are compressed chunk by chunk and flushed as they go. Server-sent
+events are left alone, since a compressor would sit on the events.
+
+Compressing the same bytes twice is wasted CPU, and catalog pages are served
+identically to everyone, so compressed bodies are kept in a small per-process
+LRU keyed by a digest of the uncompressed body.
+
+Responses carrying credentials (token endpoints) are never compressed: with
+attacker-controlled input in the same response, compression leaks secrets
+through the response size (BREACH).
+"""
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from .routing import route_name
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepted_encodings(header):
+    """Accept-Encoding -> {coding: q}"""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get('*', 0)
+    for coding in (('br', 'gzip') if brotli is not None else ('gzip',)):
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    # mtime=0 keeps output deterministic, so identical bodies compress identically
+    return gzip.compress(data, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class StreamCompressor:
+    """Incremental compressor that flushes after every chunk, so streamed rows reach the client"""
+
+    def __init__(self, encoding):
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+            self.process = self.compressor.process
+            self.flush = self.compressor.flush
+            self.finish = self.compressor.finish
+        else:
+            # wbits=31: gzip container
+            self.compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.process = self.compressor.compress
+            self.flush = lambda: self.compressor.flush(zlib.Z_SYNC_FLUSH)
+            self.finish = self.compressor.flush
+
+    def chunk(self, data):
+        return self.process(data) + self.flush()
+
+
+def compress_stream(iterator, encoding):
+    stream = StreamCompressor(encoding)
+    for data in iterator:
+        if data:
+            yield stream.chunk(data)
+    yield stream.finish()
+
+
+async def acompress_stream(iterator, encoding):
+    stream = StreamCompressor(encoding)
+    async for data in iterator:
+        if data:
+            yield stream.chunk(data)
+    yield stream.finish()
+
+
+class CompressedCache:
+    """Thread-safe LRU of compressed bodies, bounded by total compressed bytes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get_or_compress(self, content, encoding):
+        limit = settings.COMPRESSION_CACHE_BYTES
+        if not limit:
+            return compress(content, encoding)
+        key = (encoding, hashlib.blake2b(content, digest_size=16).digest())
+        with self.lock:
+            compressed = self.entries.get(key)
+            if compressed is not None:
+                self.entries.move_to_end(key)
+                return compressed
+        compressed = compress(content, encoding)
+        with self.lock:
+            if key not in self.entries and len(compressed) <= limit:
+                self.entries[key] = compressed
+                self.size += len(compressed)
+                while self.size > limit:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return compressed
+
+
+compressed_cache = CompressedCache()
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'COMPRESSION_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def compressible(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 206, 304):
+            return False
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not any(content_type.startswith(allowed) for allowed in settings.COMPRESSION_CONTENT_TYPES):
+            return False
+        return route_name(request) not in settings.COMPRESSION_EXCLUDE_VIEWS
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        if not self.compressible(request, response):
+            return response
+
+        # The body depends on Accept-Encoding from here on, whether or not this client gets it compressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response.headers['Content-Length']
+        else:
+            compressed = compressed_cache.get_or_compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A strong ETag promises byte-identical bodies, which no longer holds across encodings
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,97 @@
+"""
+Read-replica routing.
+
+``ReplicaRoutingMiddleware`` marks GET/HEAD requests to the views listed in
+``settings.REPLICA_READ_VIEWS`` as replica-safe, and ``ReplicaRouter`` sends
+their reads to one of the ``DATABASE_REPLICAS`` aliases. Everything else, and
+every write, goes to ``default``.
+
+Read-your-writes: a write inside a request pins the rest of that request to
+the primary, and any non-GET request marks its caller (Bearer-token user or
+session cookie) sticky to the primary for ``REPLICA_STICKY_SECONDS`` so the
+next page after checkout or a cart change doesn't read stale replica data.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .ratelimit import get_identity
+from .routing import route_name
+
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if replicas and _use_replica.get():
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        # Anything after a write in this request must see it
+        _use_replica.set(False)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+def _sticky_keys(request):
+    keys = []
+    for key in ('user', 'session'):
+        identity = get_identity(request, key)
+        if identity:
+            keys.append(f'db:sticky:{key}:{identity}')
+    return keys
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = _use_replica.set(self.replica_allowed(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        self.mark_sticky(request)
+        return response
+
+    async def __acall__(self, request):
+        allowed = await sync_to_async(self.replica_allowed, thread_sensitive=False)(request)
+        token = _use_replica.set(allowed)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        await sync_to_async(self.mark_sticky, thread_sensitive=False)(request)
+        return response
+
+    def replica_allowed(self, request):
+        if not getattr(settings, 'DATABASE_REPLICAS', []) or request.method not in ('GET', 'HEAD'):
+            return False
+        if route_name(request) not in getattr(settings, 'REPLICA_READ_VIEWS', ()):
+            return False
+        keys = _sticky_keys(request)
+        return not (keys and cache.get_many(keys))
+
+    def mark_sticky(self, request):
+        if not getattr(settings, 'DATABASE_REPLICAS', []) or request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return
+        ttl = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+        cache.set_many({key: 1 for key in _sticky_keys(request)}, ttl)
@@ -0,0 +1,142 @@
+"""
+gunicorn configuration: ``gunicorn --config python:storebuilder.gunicorn_conf``.
+
+Serves storebuilder.wsgi with SERVER_MODE=wsgi (default) or storebuilder.asgi
+with SERVER_MODE=asgi. Worker model and sizing come from the environment:
+
+- GUNICORN_WORKER_CLASS: ``gthread`` (default under WSGI) or ``sync``; ASGI
+  always uses uvicorn workers.
+- WEB_CONCURRENCY / GUNICORN_THREADS: fixed worker and thread counts. Without
+  them, workers are sized from the CPUs and memory the container actually
+  gets (cgroup limits included), allowing WORKER_MEMORY_MB per worker.
+- WORKER_MAX_MEMORY_MB: a worker whose RSS grows past this finishes its
+  in-flight requests and is replaced; GUNICORN_MAX_REQUESTS (with jitter)
+  recycles workers regardless, against slow memory creep.
+
+With FAST_STARTUP=True (the default) the app is imported once in the master
+(``preload_app``) and workers are forked from it, sharing its memory
+copy-on-write instead of each importing Django, DRF and the apps again; static
+files are collected from the already-loaded master, and only when they changed.
+"""
+import gc
+import math
+import os
+import signal
+import threading
+import time
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def available_cpus():
+    """CPUs this process may use: affinity mask, capped by a cgroup v2 CPU quota"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    quota = _read('/sys/fs/cgroup/cpu.max')
+    if quota and not quota.startswith('max'):
+        limit, period = quota.split()
+        cpus = min(cpus, max(1, math.ceil(int(limit) / int(period))))
+    return cpus
+
+
+def available_memory_mb():
+    """Memory limit of this container (cgroup v2/v1), else the machine's total memory"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        limit = _read(path)
+        # cgroup v1 reports "no limit" as a huge number
+        if limit and limit != 'max' and int(limit) < 1 << 60:
+            return int(limit) // (1 << 20)
+    for line in (_read('/proc/meminfo') or '').splitlines():
+        if line.startswith('MemTotal:'):
+            return int(line.split()[1]) // 1024
+    return 1024
+
+
+def rss_mb():
+    statm = _read('/proc/self/statm')
+    return int(statm.split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1 << 20) if statm else 0
+
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+FAST_STARTUP = os.environ.get('FAST_STARTUP', 'True') == 'True'
+WORKER_MEMORY_MB = _env_int('WORKER_MEMORY_MB', 256)
+WORKER_MAX_MEMORY_MB = _env_int('WORKER_MAX_MEMORY_MB', 2 * WORKER_MEMORY_MB)
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'storebuilder.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'storebuilder.wsgi:application'
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+cpus = available_cpus()
+if worker_class == 'sync':
+    # One request per process: the classic 2 x CPUs + 1
+    default_workers, threads = 2 * cpus + 1, 1
+elif worker_class == 'gthread':
+    # Threads cover requests waiting on the DB or S3; a process per CPU covers the Python work
+    default_workers, threads = cpus + 1, _env_int('GUNICORN_THREADS', 4)
+else:
+    default_workers, threads = cpus + 1, 1
+# Leave a fifth of the memory for the master, the page cache and spikes
+memory_cap = max(1, int(available_memory_mb() * 0.8) // WORKER_MEMORY_MB)
+workers = _env_int('WEB_CONCURRENCY', min(default_workers, memory_cap))
+
+bind = f'0.0.0.0:{os.environ.get("PORT", "8080")}'
+timeout = _env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+accesslog = '-'
+errorlog = '-'
+preload_app = FAST_STARTUP
+
+
+def on_starting(server):
+    server.log.info('%s workers x %s threads (%s), %s CPUs, %s MB memory; worker memory limit %s MB',
+                    workers, threads, worker_class, cpus, available_memory_mb(), WORKER_MAX_MEMORY_MB or 'off')
+    if FAST_STARTUP:
+        from django.core.management import call_command
+        call_command('collectstatic_cached')
+
+
+def when_ready(server):
+    if preload_app:
+        # Keep the garbage collector from writing to (and so un-sharing) the preloaded objects in every worker
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    if WORKER_MAX_MEMORY_MB:
+        threading.Thread(target=_watch_memory, args=(worker,), daemon=True).start()
+
+
+def _watch_memory(worker):
+    interval = _env_int('WORKER_MEMORY_CHECK_SECONDS', 10)
+    while True:
+        time.sleep(interval)
+        rss = rss_mb()
+        if rss > WORKER_MAX_MEMORY_MB:
+            worker.log.warning('Worker %s at %.0f MB RSS (limit %s MB); restarting after in-flight requests',
+                               worker.pid, rss, WORKER_MAX_MEMORY_MB)
+            # SIGTERM is every worker class's graceful shutdown; the master then starts a replacement
+            os.kill(worker.pid, signal.SIGTERM)
+            return
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges (requests in flight) from /metrics
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
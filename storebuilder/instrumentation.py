@@ -0,0 +1,206 @@
+"""
+Per-request SQL and timing instrumentation.
+
+``RequestMetricsMiddleware`` records, for every request, the number of queries,
+total DB time, repeated query signatures (the usual N+1 symptom), time spent
+serializing and rendering the response, and total latency. It reports them as a
+``Server-Timing`` header and as one structured line on the
+``storebuilder.requests`` logger, next to gunicorn's access log. For a sampled
+fraction of requests it also keeps the stack of each repeated query and logs
+them when the request turns out to be one of the worst offenders.
+"""
+import functools
+import json
+import logging
+import random
+import re
+import time
+import traceback
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import BaseSerializer
+
+from .routing import route_name
+
+
+logger = logging.getLogger('storebuilder.requests')
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def query_signature(sql):
+    """SQL with parameter lists collapsed, so the same query with different ids matches"""
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+def _app_stack():
+    """The current stack, limited to frames from this project"""
+    base_dir = str(settings.BASE_DIR)
+    frames = [frame for frame in traceback.extract_stack()[:-2]
+              if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename]
+    return ''.join(traceback.format_list(frames))
+
+
+class RequestMetrics:
+    def __init__(self, capture_stacks=False):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.serializing = False
+        self.signatures = Counter()
+        self.capture_stacks = capture_stacks
+        self.stacks = {}
+        self.duration = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            signature = query_signature(sql)
+            self.signatures[signature] += 1
+            if self.capture_stacks and self.signatures[signature] == 2:
+                self.stacks[signature] = _app_stack()
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def duplicates(self):
+        threshold = getattr(settings, 'REQUEST_METRICS_DUPLICATE_THRESHOLD', 3)
+        # Repeated reads are the N+1 symptom; repeated BEGIN/SAVEPOINT/UPDATE aren't
+        return {sql: count for sql, count in self.signatures.most_common()
+                if count >= threshold and sql.startswith('SELECT')}
+
+    def server_timing(self):
+        db_ms = self.db_time * 1000
+        ser_ms = self.serialization_time * 1000
+        total_ms = self.duration * 1000
+        return ', '.join([
+            f'db;dur={db_ms:.1f};desc="{self.queries} queries"',
+            f'ser;dur={ser_ms:.1f}',
+            f'app;dur={max(total_ms - db_ms - ser_ms, 0):.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+
+def _timed_serialization(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = current_metrics.get()
+        # Only time the outermost call; nested serializers are part of its representation
+        if metrics is None or metrics.serializing:
+            return func(*args, **kwargs)
+        metrics.serializing = True
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.serializing = False
+            metrics.serialization_time += time.perf_counter() - start
+    wrapper.timed = True
+    return wrapper
+
+
+def install_serializer_timing():
+    """Count serializer ``.data`` and JSON rendering towards serialization time"""
+    if not getattr(BaseSerializer.data.fget, 'timed', False):
+        BaseSerializer.data = property(_timed_serialization(BaseSerializer.data.fget))
+    if not getattr(JSONRenderer.render, 'timed', False):
+        JSONRenderer.render = _timed_serialization(JSONRenderer.render)
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install_query_wrapper(connection, **kwargs):
+    # Stays installed for the connection's lifetime and does nothing outside a request.
+    # Async views run their queries in sync_to_async threads with their own
+    # connections, which the request's context variable still reaches.
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install_serializer_timing()
+        connection_created.connect(install_query_wrapper)
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = self.start()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = self.start()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, metrics)
+
+    def start(self):
+        return RequestMetrics(capture_stacks=random.random() < getattr(settings, 'REQUEST_METRICS_STACK_SAMPLE_RATE', 0))
+
+    def finish(self, request, response, metrics):
+        metrics.finish()
+        request.metrics = metrics
+        if getattr(settings, 'REQUEST_METRICS_SERVER_TIMING', False):
+            response['Server-Timing'] = metrics.server_timing()
+
+        route = route_name(request)
+        duplicates = metrics.duplicates()
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            'duration_ms': round(metrics.duration * 1000, 1),
+            'queries': metrics.queries,
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'serialization_ms': round(metrics.serialization_time * 1000, 1),
+            'duplicate_queries': sum(duplicates.values()),
+        }))
+
+        worst = (metrics.queries >= getattr(settings, 'REQUEST_METRICS_SLOW_QUERY_COUNT', 50)
+                 or metrics.duration * 1000 >= getattr(settings, 'REQUEST_METRICS_SLOW_MS', 1000))
+        if worst and metrics.stacks:
+            for sql, stack in metrics.stacks.items():
+                if sql in duplicates:
+                    logger.warning('Repeated query (%sx) on %s %s: %s\n%s',
+                                   duplicates[sql], request.method, request.path, sql, stack)
+        return response
@@ -0,0 +1,129 @@
+"""
+Prometheus metrics, served as text at ``/metrics``.
+
+``PrometheusMiddleware`` records per-route request counts and latency, requests
+in flight, the query count and DB time that ``RequestMetricsMiddleware``
+measured, checkout outcomes and cart mutations (both derived from the route
+and status code). The cache backends in ``storebuilder.cache_backends`` count
+hits and misses per cache use.
+
+Under gunicorn every worker is a separate process, so ``startup.sh`` points
+``PROMETHEUS_MULTIPROC_DIR`` at an empty directory before the workers start:
+each worker then writes its samples to memory-mapped files there and
+``metrics_view`` sums them across workers. Without the variable (runserver,
+tests) the in-process registry is served.
+"""
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+from .routing import resolve_request
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+CHECKOUT_ROUTES = {'checkout', 'create_order'}
+CART_MUTATION_ROUTES = {'add_to_cart', 'update_cart_item', 'remove_from_cart', 'clear_cart', 'merge_cart'}
+
+REQUESTS = Counter('storebuilder_requests_total', 'HTTP requests', ['route', 'method', 'status'])
+REQUEST_LATENCY = Histogram('storebuilder_request_duration_seconds', 'Time to produce the response',
+                            ['route', 'method'], buckets=LATENCY_BUCKETS)
+IN_FLIGHT = Gauge('storebuilder_requests_in_flight', 'Requests being handled', multiprocess_mode='livesum')
+DB_QUERIES = Histogram('storebuilder_db_queries_per_request', 'SQL queries per request',
+                       ['route'], buckets=QUERY_COUNT_BUCKETS)
+DB_TIME = Histogram('storebuilder_db_duration_seconds', 'Time spent in SQL per request',
+                    ['route'], buckets=LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter('storebuilder_cache_requests_total', 'Cache lookups by use and result', ['use', 'result'])
+CHECKOUTS = Counter('storebuilder_checkouts_total', 'Checkout attempts by outcome', ['route', 'outcome'])
+CART_MUTATIONS = Counter('storebuilder_cart_mutations_total', 'Cart changes by outcome', ['route', 'outcome'])
+
+
+def _outcome(status_code):
+    if status_code < 400:
+        return 'success'
+    if status_code < 500:
+        return 'rejected'
+    return 'error'
+
+
+def observe_request(request, response, duration):
+    match = resolve_request(request)
+    # Don't let scanners create a label per random path
+    route = (match.url_name or 'unnamed') if match is not None else 'not_found'
+    REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+    REQUEST_LATENCY.labels(route, request.method).observe(duration)
+
+    request_metrics = getattr(request, 'metrics', None)
+    if request_metrics is not None:
+        DB_QUERIES.labels(route).observe(request_metrics.queries)
+        DB_TIME.labels(route).observe(request_metrics.db_time)
+
+    if route in CHECKOUT_ROUTES:
+        CHECKOUTS.labels(route, _outcome(response.status_code)).inc()
+    elif route in CART_MUTATION_ROUTES:
+        CART_MUTATIONS.labels(route, _outcome(response.status_code)).inc()
+
+
+class PrometheusMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        IN_FLIGHT.inc()
+        try:
+            response = self.get_response(request)
+        finally:
+            IN_FLIGHT.dec()
+        observe_request(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        IN_FLIGHT.inc()
+        try:
+            response = await self.get_response(request)
+        finally:
+            IN_FLIGHT.dec()
+        observe_request(request, response, time.perf_counter() - start)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus text exposition; requires ``Authorization: Bearer <METRICS_TOKEN>``
+
+    Without a token it's only served with DEBUG on: traffic, checkout outcomes
+    and cache internals aren't for the public.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse('Metrics are disabled until METRICS_TOKEN is set', status=403,
+                                content_type='text/plain')
+    elif request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
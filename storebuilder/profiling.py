@@ -0,0 +1,312 @@
+"""
+Opt-in request profiling.
+
+``ProfilingMiddleware`` profiles a request when a staff user sends
+``X-Profile: 1``, or for a random ``PROFILING_SAMPLE_RATE`` fraction of
+requests to ``PROFILING_VIEWS`` (all views when empty). Every other request
+pays for a header lookup and a random number.
+
+The view runs under pyinstrument (a sampling profiler, low overhead) when it
+is installed and ``PROFILING_ENGINE`` allows, else under cProfile. Each
+profile is saved in ``PROFILING_DIR`` with a JSON summary: the request, its
+SQL and serializer time (from ``storebuilder.instrumentation``) and the top
+functions by cumulative time. Only the newest ``PROFILING_MAX_PROFILES`` are
+kept. Staff list them at ``/api/profiles/`` and download the raw profile
+(``.prof`` for pstats/snakeviz, ``.html`` from pyinstrument) from
+``/api/profiles/<id>/download/``. The response of a header-triggered request
+carries ``X-Profile-Id``.
+"""
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+
+from auth_api.authentication import ClaimsJWTAuthentication
+
+from .instrumentation import current_metrics
+from .routing import route_name
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+
+PROFILE_ID = re.compile(r'^\d+-[0-9a-f]{8}$')
+
+# One profiler per thread: under ASGI, requests sharing the event loop thread can't be profiled together
+_active = threading.local()
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILING_DIR', None) or os.path.join(tempfile.gettempdir(), 'storebuilder-profiles')
+
+
+def _short_path(filename, prefixes):
+    for prefix in prefixes:
+        if filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+
+class CProfileEngine:
+    name = 'cprofile'
+    extension = 'prof'
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def save(self, path):
+        self.profiler.dump_stats(path)
+
+    def summary(self, limit):
+        stats = pstats.Stats(self.profiler)
+        # Longest first, so site-packages wins over the sys.path entry above it
+        prefixes = sorted({str(settings.BASE_DIR), *(path for path in sys.path if path)}, key=len, reverse=True)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+        return {'top': [{
+            'function': f'{_short_path(filename, prefixes)}:{line}({function})' if line else function,
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 2),
+            'cumtime_ms': round(cumtime * 1000, 2),
+        } for (filename, line, function), (_, calls, tottime, cumtime, _) in rows]}
+
+
+class PyinstrumentEngine:
+    name = 'pyinstrument'
+    extension = 'html'
+
+    def __init__(self):
+        self.profiler = pyinstrument.Profiler(interval=0.001, async_mode='disabled')
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            f.write(self.profiler.output_html())
+
+    def summary(self, limit):
+        # The call tree with cumulative times, trimmed to its heaviest lines
+        text = self.profiler.output_text(unicode=False, color=False)
+        return {'tree': '\n'.join(text.splitlines()[:limit * 2])}
+
+
+def get_engine():
+    engine = getattr(settings, 'PROFILING_ENGINE', 'auto')
+    if engine == 'pyinstrument' or (engine == 'auto' and pyinstrument is not None):
+        return PyinstrumentEngine()
+    return CProfileEngine()
+
+
+def save_profile(engine, summary):
+    """Write a profile and its summary; drops the oldest beyond PROFILING_MAX_PROFILES"""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    profile_id = summary['id']
+    engine.save(os.path.join(directory, f'{profile_id}.{engine.extension}'))
+    # The summary goes last and atomically: listings only see complete profiles
+    tmp = os.path.join(directory, f'.{profile_id}.json')
+    with open(tmp, 'w') as f:
+        json.dump(summary, f)
+    os.replace(tmp, os.path.join(directory, f'{profile_id}.json'))
+
+    # Ids start with a millisecond timestamp, so name order is age order
+    ids = sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json') and not name.startswith('.'))
+    for old in ids[:-getattr(settings, 'PROFILING_MAX_PROFILES', 50)]:
+        for name in os.listdir(directory):
+            if name.startswith(old + '.'):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+
+
+def load_summary(profile_id):
+    if not PROFILE_ID.match(profile_id):
+        raise Http404
+    try:
+        with open(os.path.join(profile_dir(), f'{profile_id}.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise Http404
+
+
+def is_staff(request):
+    """Staff caller by Bearer token or session; the header alone must not turn profiling on"""
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    user = result[0] if result is not None else getattr(request, 'user', None)
+    return bool(user is not None and user.is_active and user.is_staff)
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def sampled(self, request):
+        rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        if not rate or random.random() >= rate:
+            return False
+        views = getattr(settings, 'PROFILING_VIEWS', [])
+        if not views:
+            return True
+        return route_name(request) in views
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if request.META.get('HTTP_X_PROFILE') == '1' and is_staff(request):
+            trigger = 'header'
+        elif self.sampled(request):
+            trigger = 'sample'
+        else:
+            return self.get_response(request)
+        if getattr(_active, 'engine', None) is not None:
+            return self.get_response(request)
+        engine, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.stop(engine)
+        return self.finish(request, response, engine, started, trigger)
+
+    async def __acall__(self, request):
+        if request.META.get('HTTP_X_PROFILE') == '1' and await sync_to_async(is_staff)(request):
+            trigger = 'header'
+        elif self.sampled(request):
+            trigger = 'sample'
+        else:
+            return await self.get_response(request)
+        if getattr(_active, 'engine', None) is not None:
+            return await self.get_response(request)
+        # Profiles the event loop thread: sync code handed to worker threads isn't in the profile
+        engine, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.stop(engine)
+        return await sync_to_async(self.finish, thread_sensitive=False)(request, response, engine, started, trigger)
+
+    def start(self):
+        engine = get_engine()
+        _active.engine = engine
+        metrics = current_metrics.get()
+        # SQL and serializer time so far, subtracted at the end
+        started = (time.perf_counter(), metrics.db_time if metrics else 0, metrics.serialization_time if metrics else 0,
+                   metrics.queries if metrics else 0)
+        engine.start()
+        return engine, started
+
+    def stop(self, engine):
+        engine.stop()
+        _active.engine = None
+
+    def finish(self, request, response, engine, started, trigger):
+        started_at, db_time, serialization_time, queries = started
+        metrics = current_metrics.get()
+        route = route_name(request)
+        user = getattr(request, 'user', None)
+        profile_id = f'{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}'
+        summary = {
+            'id': profile_id,
+            'created_at': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'query': request.META.get('QUERY_STRING', ''),
+            'route': route,
+            'status': response.status_code,
+            'trigger': trigger,
+            'user': user.username if user is not None and user.is_authenticated else None,
+            'engine': engine.name,
+            'duration_ms': round((time.perf_counter() - started_at) * 1000, 1),
+            'queries': metrics.queries - queries if metrics else None,
+            'db_ms': round((metrics.db_time - db_time) * 1000, 1) if metrics else None,
+            'serialization_ms': round((metrics.serialization_time - serialization_time) * 1000, 1) if metrics else None,
+            **engine.summary(getattr(settings, 'PROFILING_TOP_FUNCTIONS', 30)),
+        }
+        save_profile(engine, summary)
+        if trigger == 'header':
+            response['X-Profile-Id'] = profile_id
+            # Not for the CDN to hand out to others
+            add_never_cache_headers(response)
+        return response
+
+
+# Staff endpoints
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def profile_list(request):
+    directory = profile_dir()
+    try:
+        names = sorted((name for name in os.listdir(directory) if name.endswith('.json') and not name.startswith('.')),
+                       reverse=True)
+    except FileNotFoundError:
+        names = []
+    profiles = []
+    for name in names:
+        try:
+            summary = load_summary(name[:-5])
+        except Http404:
+            # Rotated out since the listing
+            continue
+        summary.pop('top', None)
+        summary.pop('tree', None)
+        profiles.append(summary)
+    return Response(profiles)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def profile_detail(request, profile_id):
+    return Response(load_summary(profile_id))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def profile_download(request, profile_id):
+    summary = load_summary(profile_id)
+    extension = PyinstrumentEngine.extension if summary['engine'] == 'pyinstrument' else CProfileEngine.extension
+    try:
+        return FileResponse(open(os.path.join(profile_dir(), f'{profile_id}.{extension}'), 'rb'),
+                            as_attachment=True, filename=f'{profile_id}.{extension}')
+    except FileNotFoundError:
+        raise Http404
@@ -0,0 +1,199 @@
+"""
+Per-endpoint query budgets.
+
+Every named route in ``stores.urls`` and ``auth_api.urls`` has an entry in
+``QUERY_BUDGETS``: one or more requests to make against a small fixture data
+set, and the most queries each may run. Budgets are measured with several rows
+behind every list, so an N+1 shows up as a blown budget rather than a constant.
+They record what each endpoint runs today: lower them as endpoints get fixed.
+
+``check_query_budgets()`` runs them all and returns the failures; it's what the
+``check_query_budgets`` management command and ``QueryBudgetTestMixin`` use.
+A route without a budget is itself a failure, so new endpoints can't skip this.
+"""
+from decimal import Decimal
+from typing import Callable, NamedTuple, Optional
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from rest_framework.test import APIClient
+
+from auth_api.revocation import revocation_store
+from auth_api.tokens import UserClaimsRefreshToken
+from stores.models import Cart, CartItem, Order, OrderItem, Product, Store
+from stores.outbox import record_order_created
+
+
+BUDGETED_URLCONFS = ('stores.urls', 'auth_api.urls')
+
+FIXTURE_ROWS = 3
+
+
+class Check(NamedTuple):
+    method: str
+    budget: int
+    as_user: Optional[str] = 'customer'   # key into the fixtures, or None for anonymous
+    kwargs: Callable = lambda f: {}       # fixtures -> URL kwargs
+    data: Callable = lambda f: None       # fixtures -> request body
+    query: str = ''
+
+
+QUERY_BUDGETS = {
+    'api-root': [Check('get', 1)],
+    'store-list': [Check('get', 1, as_user=None), Check('post', 3, as_user='owner', data=lambda f: {'name': 'New'})],
+    'store-detail': [
+        Check('get', 2, as_user=None, kwargs=lambda f: {'pk': f['store'].id}),
+        Check('patch', 4, as_user='owner', kwargs=lambda f: {'pk': f['store'].id}, data=lambda f: {'name': 'Renamed'}),
+    ],
+    'store-products': [Check('get', 2, as_user=None, kwargs=lambda f: {'pk': f['store'].id})],
+    'product-list': [Check('get', 1, as_user=None)],
+    'product-detail': [Check('get', 1, as_user=None, kwargs=lambda f: {'pk': f['product'].id})],
+    'get_user_stores': [Check('get', 2, as_user=None, kwargs=lambda f: {'user_id': f['owner'].id})],
+    'get_csrf_token': [Check('get', 0, as_user=None)],
+    'get_cart': [Check('get', 18), Check('get', 11, as_user=None)],
+    'add_to_cart': [Check('post', 15, data=lambda f: {'product_id': f['product'].id, 'quantity': 1})],
+    'update_cart_item': [Check('put', 14, kwargs=lambda f: {'product_id': f['product'].id},
+                               data=lambda f: {'quantity': 2})],
+    'remove_from_cart': [Check('delete', 12, kwargs=lambda f: {'product_id': f['product'].id})],
+    'clear_cart': [Check('delete', 7)],
+    'checkout': [Check('post', 18, data=lambda f: {'shipping_address': '1 Main St', 'phone': '555'})],
+    'merge_cart': [Check('post', 1)],
+    'create_order': [Check('post', 16, data=lambda f: {
+        'shipping_address': '1 Main St', 'phone': '555',
+        'items': [{'product_id': p.id, 'quantity': 1} for p in f['products']],
+    })],
+    'get_user_orders': [Check('get', 4)],
+    'bulk_update_order_status': [Check('post', 6, as_user='owner', data=lambda f: {
+        'order_ids': [o.id for o in f['orders']], 'status': 'confirmed',
+    })],
+    'get_order_detail': [Check('get', 5, kwargs=lambda f: {'order_id': f['order'].id})],
+    'update_order_status': [Check('put', 9, as_user='owner', kwargs=lambda f: {'order_id': f['order'].id},
+                                  data=lambda f: {'status': 'confirmed'})],
+    'approve_order': [Check('post', 9, as_user='owner', kwargs=lambda f: {'order_id': f['order'].id})],
+    'decline_order': [Check('post', 9, as_user='owner', kwargs=lambda f: {'order_id': f['order'].id})],
+    'get_store_orders': [Check('get', 5, as_user='owner', kwargs=lambda f: {'store_id': f['store'].id})],
+    'order_events_feed': [Check('get', 3, as_user='owner', kwargs=lambda f: {'store_id': f['store'].id},
+                                query='mode=poll&cursor=0')],
+    'export_store_orders': [Check('get', 3, as_user='owner', kwargs=lambda f: {'store_id': f['store'].id})],
+    'register': [Check('post', 2, as_user=None, data=lambda f: {
+        'username': 'budget_new', 'email': 'new@example.com', 'password': 'Budget-pass-1', 'password_confirm': 'Budget-pass-1',
+    })],
+    'login': [Check('post', 1, as_user=None, data=lambda f: {'username': 'budget_customer', 'password': f['password']})],
+    'logout': [Check('post', 5, data=lambda f: {'refresh': f['refresh']['customer']})],
+    'profile': [Check('get', 1)],
+    'token_obtain_pair': [Check('post', 1, as_user=None,
+                                data=lambda f: {'username': 'budget_customer', 'password': f['password']})],
+    'token_refresh': [Check('post', 5, as_user=None, data=lambda f: {'refresh': f['refresh']['customer']})],
+}
+
+
+def budgeted_routes(urlconfs=BUDGETED_URLCONFS):
+    """Names of every named route in urlconfs (format-suffix duplicates collapsed)"""
+    names = set()
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                names.add(pattern.name)
+
+    for urlconf in urlconfs:
+        walk(get_resolver(urlconf).url_patterns)
+    return names
+
+
+def create_fixtures():
+    password = 'Budget-pass-1'
+    owner = User.objects.create_user('budget_owner', password=password)
+    customer = User.objects.create_user('budget_customer', password=password)
+    stores = [Store.objects.create(name=f'Budget store {i}', owner=owner) for i in range(FIXTURE_ROWS)]
+    products = [
+        Product.objects.create(name=f'Budget product {i}', store=stores[0], price=Decimal('10.00'), stock=100)
+        for i in range(FIXTURE_ROWS)
+    ]
+    for store in stores[1:]:
+        Product.objects.create(name=f'{store.name} product', store=store, price=Decimal('5.00'), stock=100)
+
+    cart = Cart.objects.create(user=customer)
+    for product in products:
+        CartItem.objects.create(cart=cart, product=product, quantity=1)
+
+    orders = []
+    for i in range(FIXTURE_ROWS):
+        order = Order.objects.create(customer=customer, store=stores[0], total_amount=Decimal('20.00'),
+                                     shipping_address='1 Main St', phone='555')
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=2, price=product.price)
+        orders.append(order)
+    record_order_created(orders)
+
+    users = {'owner': owner, 'customer': customer}
+    return {
+        **users,
+        'password': password,
+        'store': stores[0],
+        'stores': stores,
+        'product': products[0],
+        'products': products,
+        'order': orders[0],
+        'orders': orders,
+        'refresh': {name: str(UserClaimsRefreshToken.for_user(user)) for name, user in users.items()},
+    }
+
+
+def count_queries(fixtures, name, check):
+    """Make one budgeted request; returns (status_code, number of queries)"""
+    client = APIClient()
+    if check.as_user:
+        access = UserClaimsRefreshToken(fixtures['refresh'][check.as_user]).access_token
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+    url = reverse(name, kwargs=check.kwargs(fixtures))
+    if check.query:
+        url = f'{url}?{check.query}'
+    # Sync the revocation filter now so its periodic refresh doesn't land in some route's count
+    revocation_store.is_revoked('')
+
+    with CaptureQueriesContext(connection) as queries:
+        response = getattr(client, check.method)(url, check.data(fixtures), format='json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return response.status_code, len(queries)
+
+
+@override_settings(RATE_LIMIT_ENABLED=False, RESPONSE_CACHE_ENABLED=False)
+def check_query_budgets(routes=None, urlconfs=BUDGETED_URLCONFS):
+    """
+    Run the budgeted requests for routes (default: every route in urlconfs), each
+    against fresh fixtures rolled back afterwards. Returns (results, failures):
+    results are (route, method, status, queries, budget) tuples, failures are messages.
+    """
+    known = budgeted_routes(urlconfs)
+    failures = [f'{name}: no query budget' for name in sorted(known - set(QUERY_BUDGETS))]
+    results = []
+    for name in sorted(routes or known & set(QUERY_BUDGETS)):
+        for check in QUERY_BUDGETS[name]:
+            with transaction.atomic():
+                fixtures = create_fixtures()
+                status_code, queries = count_queries(fixtures, name, check)
+                transaction.set_rollback(True)
+            results.append((name, check.method.upper(), status_code, queries, check.budget))
+            if status_code >= 400:
+                failures.append(f'{name} {check.method.upper()}: status {status_code}')
+            elif queries > check.budget:
+                failures.append(f'{name} {check.method.upper()}: {queries} queries, budget {check.budget}')
+    return results, failures
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin: ``test_query_budgets`` fails on any route of ``budget_urlconfs`` over (or missing) its budget"""
+    budget_urlconfs = BUDGETED_URLCONFS
+
+    def test_query_budgets(self):
+        # Fixtures, users included, are created afresh for every request: don't spend the run hashing passwords
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']):
+            results, failures = check_query_budgets(urlconfs=self.budget_urlconfs)
+        if failures:
+            self.fail('Query budgets exceeded:\n' + '\n'.join(failures))
@@ -0,0 +1,140 @@
+"""
+Cache-backed rate limiting for expensive or abusable endpoints.
+
+Limits are configured per URL name in ``settings.RATE_LIMITS`` and enforced by
+``RateLimitMiddleware`` before sessions, authentication or views run, so a
+rejected request costs one or two cache round-trips and no database work.
+
+Each limit is a sliding window over two fixed-window counters kept in the
+default cache and updated with atomic ``incr``. With a shared cache (Redis or
+Memcached, see ``CACHES``) the limits hold across gunicorn workers and nodes;
+with the local-memory fallback they are per process.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .routing import route_name
+
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def client_ip(request):
+    if getattr(settings, 'RATE_LIMIT_USE_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            # The right-most entry is the address our own proxy saw
+            return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def token_user_id(request):
+    """User id from a valid Bearer access token; verifies the signature only, no DB lookup"""
+    header = request.META.get(api_settings.AUTH_HEADER_NAME, '')
+    parts = header.split()
+    if len(parts) != 2 or parts[0] not in api_settings.AUTH_HEADER_TYPES:
+        return None
+    try:
+        return AccessToken(parts[1]).get(api_settings.USER_ID_CLAIM)
+    except TokenError:
+        return None
+
+
+def get_identity(request, key):
+    if key == 'ip':
+        return client_ip(request)
+    if key == 'user':
+        return token_user_id(request)
+    if key == 'session':
+        return request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    raise ValueError(f'Unknown rate limit key: {key}')
+
+
+def hit(name, key, identity, rate, now=None):
+    """Count one request against a limit; returns seconds to wait if it is exceeded, else None"""
+    limit, period = parse_rate(rate)
+    now = now if now is not None else time.time()
+    window = int(now // period)
+    prefix = f'rl:{name}:{key}:{period}:{identity}'
+    current_key = f'{prefix}:{window}'
+
+    cache.add(current_key, 0, period * 2)
+    try:
+        current = cache.incr(current_key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(current_key, 1, period * 2)
+        current = 1
+    previous = cache.get(f'{prefix}:{window - 1}', 0)
+
+    # Weight the previous window by how much of it still overlaps the sliding window
+    elapsed = (now % period) / period
+    if previous * (1 - elapsed) + current <= limit:
+        return None
+    return max(1, int(period - now % period))
+
+
+class RateLimitMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        limits = self.limits_for(request)
+        if limits:
+            retry_after = self.check(request, limits)
+            if retry_after is not None:
+                return self.too_many_requests(retry_after)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        limits = self.limits_for(request)
+        if limits:
+            # Cache backends may block, so keep the counter round-trips off the event loop
+            retry_after = await sync_to_async(self.check, thread_sensitive=False)(request, limits)
+            if retry_after is not None:
+                return self.too_many_requests(retry_after)
+        return await self.get_response(request)
+
+    def limits_for(self, request):
+        limits = getattr(settings, 'RATE_LIMITS', {})
+        if not getattr(settings, 'RATE_LIMIT_ENABLED', True) or not limits or request.method == 'OPTIONS':
+            return ()
+        name = route_name(request)
+        return [(name, key, rate) for key, rate in limits.get(name, ())]
+
+    def check(self, request, limits):
+        retry_after = None
+        for name, key, rate in limits:
+            identity = get_identity(request, key)
+            if identity is None or identity == '':
+                continue
+            wait = hit(name, key, identity, rate)
+            if wait is not None:
+                retry_after = max(retry_after or 0, wait)
+        return retry_after
+
+    def too_many_requests(self, retry_after):
+        response = JsonResponse({'error': 'Too many requests. Please try again later.'}, status=429)
+        response['Retry-After'] = str(retry_after)
+        return response
@@ -0,0 +1,285 @@
+"""
+Server-side cache of the public catalog responses.
+
+``ResponseCacheMiddleware`` serves anonymous GET/HEAD requests to the views in
+``RESPONSE_CACHE_VIEWS`` from a cache keyed on the normalised URL (scheme,
+host, path and sorted query parameters). On a miss the view runs and its
+response is stored, tagged with the same ``CACHE_TAGS`` the CDN sees
+(``store-3``, ``owner-7``, ``products``...). ``stores.signals`` invalidates
+tags when stores and products change.
+
+Tags are invalidated by giving them a new version in the default cache; an
+entry is only served while every tag still has the version it was stored
+with, so one write invalidates every entry it affects in every process
+sharing that cache (Redis). The versions are read before the view runs: a
+response computed from rows that a write then replaced is stored under the
+versions that write has since bumped, and is never served. With the local-memory cache, other processes only
+see a change once their entries expire.
+
+Entries live in a per-process LRU bounded by ``RESPONSE_CACHE_LOCAL_BYTES``
+and, with ``RESPONSE_CACHE_SHARED``, in the default cache too. Against
+stampedes, one request per key recomputes (a lock in the default cache) while
+the rest serve the previous copy or wait for the new one, and entries are
+refreshed probabilistically before they expire (XFetch: the longer a
+response took to compute, the earlier), so a hot key rarely expires at all.
+"""
+import asyncio
+import hashlib
+import math
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.http import urlencode
+
+from .routing import resolve_request
+
+
+# Entries stay servable this long past their expiry while one request recomputes them
+STALE_SECONDS = 30
+WAIT_INTERVAL = 0.05
+
+
+def _tag_key(tag):
+    return f'rc:tag:{tag}'
+
+
+def invalidate(tags):
+    """Give tags new versions, orphaning every entry stored under the old ones"""
+    cache.set_many({_tag_key(tag): secrets.token_hex(8) for tag in tags}, None)
+
+
+def schedule_invalidation(tags):
+    """Invalidate now and again once the transaction commits, so a read racing the write can't re-cache old rows"""
+    if not getattr(settings, 'RESPONSE_CACHE_ENABLED', True):
+        return
+    tags = set(tags)
+    invalidate(tags)
+    transaction.on_commit(lambda: invalidate(tags))
+
+
+def tag_versions(tags):
+    keys = {_tag_key(tag): tag for tag in tags}
+    return {keys[key]: version for key, version in cache.get_many(keys).items()}
+
+
+class Entry:
+    __slots__ = ('content', 'status', 'headers', 'tags', 'expires', 'delta')
+
+    def __init__(self, content, status, headers, tags, expires, delta):
+        self.content = content
+        self.status = status
+        self.headers = headers
+        self.tags = tags
+        self.expires = expires
+        self.delta = delta
+
+    def should_refresh(self, beta):
+        # XFetch: recompute early with a probability that rises towards expiry, scaled by the compute time
+        return time.time() - self.delta * beta * math.log(1 - random.random()) >= self.expires
+
+    def response(self):
+        response = HttpResponse(self.content, status=self.status)
+        for name, value in self.headers:
+            response.headers[name] = value
+        return response
+
+
+class ResponseCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = OrderedDict()
+        self.local_size = 0
+
+    # Per-process tier
+
+    def get_local(self, key):
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is not None:
+                self.local.move_to_end(key)
+            return entry
+
+    def set_local(self, key, entry):
+        limit = settings.RESPONSE_CACHE_LOCAL_BYTES
+        if len(entry.content) > limit:
+            return
+        with self.lock:
+            previous = self.local.pop(key, None)
+            if previous is not None:
+                self.local_size -= len(previous.content)
+            self.local[key] = entry
+            self.local_size += len(entry.content)
+            while self.local_size > limit:
+                _, evicted = self.local.popitem(last=False)
+                self.local_size -= len(evicted.content)
+
+    def discard_local(self, key):
+        with self.lock:
+            entry = self.local.pop(key, None)
+            if entry is not None:
+                self.local_size -= len(entry.content)
+
+    # Both tiers
+
+    def get(self, key):
+        """The entry for key if it's servable: not past its stale window and no tag invalidated since"""
+        entry = self.get_local(key)
+        if entry is None and settings.RESPONSE_CACHE_SHARED:
+            entry = cache.get(key)
+            if entry is not None:
+                self.set_local(key, entry)
+        if entry is None:
+            return None
+        if time.time() > entry.expires + STALE_SECONDS or tag_versions(entry.tags) != entry.tags:
+            self.discard_local(key)
+            return None
+        return entry
+
+    def versions(self, tags):
+        """Current versions of tags, giving untracked tags a first one; read before computing a response"""
+        versions = tag_versions(tags)
+        missing = set(tags) - set(versions)
+        for tag in missing:
+            # add(): another process may be setting the first version at the same time
+            cache.add(_tag_key(tag), secrets.token_hex(8), None)
+        return tag_versions(tags) if missing else versions
+
+    def set(self, key, entry, timeout):
+        """Store entry, whose tags hold the versions read before its response was computed"""
+        self.set_local(key, entry)
+        if settings.RESPONSE_CACHE_SHARED:
+            cache.set(key, entry, timeout + STALE_SECONDS)
+
+    def acquire(self, key):
+        return cache.add(f'{key}:lock', 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT)
+
+    def release(self, key):
+        cache.delete(f'{key}:lock')
+
+    def begin(self, key):
+        """
+        (entry, compute) for a request: a fresh entry to serve; or compute=True
+        with the lock held, to recompute (entry may be None); or, while another
+        request recomputes, the stale entry to serve, or (None, False) to wait.
+        """
+        entry = self.get(key)
+        if entry is not None and not entry.should_refresh(settings.RESPONSE_CACHE_EARLY_BETA):
+            return entry, False
+        if self.acquire(key):
+            return entry, True
+        return entry, False
+
+
+response_cache = ResponseCache()
+
+
+class ResponseCacheMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'RESPONSE_CACHE_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.abegin = sync_to_async(response_cache.begin, thread_sensitive=False)
+            self.aget = sync_to_async(response_cache.get, thread_sensitive=False)
+            self.aclose = sync_to_async(self.close, thread_sensitive=False)
+            self.aversions = sync_to_async(response_cache.versions, thread_sensitive=False)
+
+    def match(self, request):
+        """(cache key, tags, timeout) for a cacheable request, else None"""
+        # Token holders skip the cache: a bad token must still get its 401
+        if request.method not in ('GET', 'HEAD') or 'HTTP_AUTHORIZATION' in request.META:
+            return None
+        # Profiled requests (storebuilder.profiling) must reach the view
+        if 'HTTP_X_PROFILE' in request.META:
+            return None
+        # Only JSON is cached; the browsable API renders per user
+        if 'text/html' in request.META.get('HTTP_ACCEPT', ''):
+            return None
+        match = resolve_request(request)
+        if match is None:
+            return None
+        timeout = settings.RESPONSE_CACHE_VIEWS.get(match.url_name)
+        if timeout is None:
+            return None
+        query = urlencode(sorted(request.GET.lists()), doseq=True)
+        url = f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+        key = 'rc:' + hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
+        tags = [tag.format(**match.kwargs) for tag in settings.CACHE_TAGS.get(match.url_name, ())]
+        return key, tags, timeout
+
+    def cacheable(self, response):
+        return (response.status_code == 200 and not response.streaming and not response.cookies
+                and response.get('Content-Type', '').startswith('application/json')
+                and 'no-store' not in response.get('Cache-Control', '')
+                and 'private' not in response.get('Cache-Control', ''))
+
+    def close(self, matched, versions, response, delta, lock_held):
+        """Store a freshly computed response under the tag versions read before it, and release the recompute lock"""
+        key, tags, timeout = matched
+        try:
+            if self.cacheable(response):
+                headers = [(name, value) for name, value in response.items() if name != 'Content-Length']
+                entry = Entry(response.content, response.status_code, headers, versions,
+                              time.time() + timeout, delta)
+                response_cache.set(key, entry, timeout)
+        finally:
+            if lock_held:
+                response_cache.release(key)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        matched = self.match(request)
+        if matched is None:
+            return self.get_response(request)
+        key = matched[0]
+        entry, compute = response_cache.begin(key)
+        if entry is not None and not compute:
+            return entry.response()
+        if not compute:
+            deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(WAIT_INTERVAL)
+                entry = response_cache.get(key)
+                if entry is not None:
+                    return entry.response()
+        versions = response_cache.versions(matched[1])
+        started = time.monotonic()
+        response = self.get_response(request)
+        self.close(matched, versions, response, time.monotonic() - started, compute)
+        return response
+
+    async def __acall__(self, request):
+        matched = self.match(request)
+        if matched is None:
+            return await self.get_response(request)
+        key = matched[0]
+        entry, compute = await self.abegin(key)
+        if entry is not None and not compute:
+            return entry.response()
+        if not compute:
+            deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+            while time.monotonic() < deadline:
+                await asyncio.sleep(WAIT_INTERVAL)
+                entry = await self.aget(key)
+                if entry is not None:
+                    return entry.response()
+        versions = await self.aversions(matched[1])
+        started = time.monotonic()
+        response = await self.get_response(request)
+        await self.aclose(matched, versions, response, time.monotonic() - started, compute)
+        return response
@@ -0,0 +1,34 @@
+"""
+Route lookup shared by the middlewares in this package.
+
+Several of them key their behaviour on the URL name of the request. Django
+sets ``request.resolver_match`` only once the view is about to run, so
+request-side hooks resolve the path themselves: ``resolve_request`` does that
+once per request and keeps the result on the request, and response-side hooks
+get Django's own match.
+"""
+from django.urls import Resolver404, resolve
+
+
+_UNRESOLVED = object()
+
+
+def resolve_request(request):
+    """The request's ResolverMatch, or None when its path matches no route"""
+    match = getattr(request, 'resolver_match', None)
+    if match is not None:
+        return match
+    match = getattr(request, '_storebuilder_match', _UNRESOLVED)
+    if match is _UNRESOLVED:
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            match = None
+        request._storebuilder_match = match
+    return match
+
+
+def route_name(request):
+    """URL name of the request's route; None when unnamed or unresolved"""
+    match = resolve_request(request)
+    return match.url_name if match is not None else None
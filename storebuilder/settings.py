@@ -10,10 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import copy
 from pathlib import Path
 from datetime import timedelta
 from corsheaders.defaults import default_headers
-import boto3
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,17 +46,26 @@ INSTALLED_APPS = [
     'storages',
     'auth_api',
     'stores',
+    'taskqueue',
 ]
 
 MIDDLEWARE = [
+    'storebuilder.metrics.PrometheusMiddleware',
+    'storebuilder.instrumentation.RequestMetricsMiddleware',
+    'storebuilder.compression.CompressionMiddleware',
+    'storebuilder.cdn.CDNCacheMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'storebuilder.ratelimit.RateLimitMiddleware',
+    'storebuilder.response_cache.ResponseCacheMiddleware',
+    'storebuilder.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'storebuilder.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'storebuilder.urls'
@@ -77,17 +86,117 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'storebuilder.wsgi.application'
+ASGI_APPLICATION = 'storebuilder.asgi.application'
+
+# 'wsgi' (gunicorn sync workers) or 'asgi' (gunicorn + uvicorn workers); see startup.sh.
+# In ASGI mode the catalog and cart read endpoints are served by stores.async_views.
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+ASYNC_VIEWS = SERVER_MODE == 'asgi'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# DB_ENGINE=postgres for production; sqlite (the default) is for development.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'storebuilder'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # Keep connections open between requests and check them before reuse
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('DB_POOL', 'False') == 'True':
+        # psycopg connection pool per worker process; replaces persistent connections
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {},
+        }
+    }
+    if os.environ.get('DB_SQLITE_TUNING', 'True') == 'True':
+        # WAL lets readers run alongside the single writer; writers wait on the
+        # lock (timeout, in seconds) instead of failing with "database is locked",
+        # and IMMEDIATE transactions take the write lock up front so concurrent
+        # checkouts queue instead of deadlocking on lock upgrade.
+        DATABASES['default']['OPTIONS'] = {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA busy_timeout=20000',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        }
+else:
+    raise ValueError(f'Unsupported DB_ENGINE: {DB_ENGINE}')
+
+# Read replicas: comma-separated hosts (postgres) or database files (sqlite),
+# e.g. DB_NAME=primary.sqlite3 DB_REPLICAS=replica.sqlite3 to try it locally.
+# See storebuilder/db_router.py for which reads are routed to them.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = copy.deepcopy(DATABASES['default'])
+    DATABASES[alias]['HOST' if DB_ENGINE == 'postgres' else 'NAME'] = replica.strip()
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['storebuilder.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 10
+REPLICA_READ_VIEWS = [
+    'store-list', 'store-detail', 'store-products', 'product-list', 'product-detail',
+    'get_user_stores', 'get_user_orders', 'get_store_orders', 'get_order_detail', 'export_store_orders',
+]
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+
+# Cache
+# Rate limits and other shared counters need a cache shared by every worker;
+# set REDIS_URL in production (requires the `redis` package).
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'storebuilder.cache_backends.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'storebuilder.cache_backends.LocMemCache',
+        }
+    }
+
+
+# Sessions
+# Anonymous visitors only use the session for their guest cart key, so keep
+# sessions out of the primary database: signed cookies by default, or the shared
+# cache when Redis is configured. SESSION_BACKEND=db restores database sessions.
+# Carts created under database sessions are adopted from the old session cookie
+# (CART_ADOPT_LEGACY_SESSIONS).
+
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cache' if os.environ.get('REDIS_URL') else 'signed_cookies')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_BACKEND]
+SESSION_COOKIE_HTTPONLY = True
+CART_ADOPT_LEGACY_SESSIONS = True
 
 
 # Password validation
@@ -162,7 +271,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'auth_api.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -184,8 +293,106 @@ SIMPLE_JWT = {
     'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
     'USER_ID_FIELD': 'id',
     'USER_ID_CLAIM': 'user_id',
+    'TOKEN_OBTAIN_SERIALIZER': 'auth_api.serializers.UserClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'auth_api.serializers.UserClaimsTokenRefreshSerializer',
 }
 
+# Refresh-token revocation (auth_api.revocation): how often each process picks up
+# revocations made elsewhere, and how often its bloom filter is rebuilt/pruned
+TOKEN_REVOCATION_SYNC_SECONDS = 5
+TOKEN_REVOCATION_REBUILD_SECONDS = 3600
+TOKEN_REVOCATION_BLOOM_BITS = 1 << 20
+TOKEN_REVOCATION_LRU_SIZE = 4096
+
+# How long ClaimsJWTAuthentication trusts cached is_active/profile data for a user
+AUTH_USER_STATE_CACHE_TTL = 60
+
+# Rate limiting (storebuilder.ratelimit). Keys: 'ip', 'user' (from the Bearer
+# token) and 'session' (session cookie); rates are '<count>/<s|min|hour|day>'.
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True') == 'True'
+RATE_LIMIT_USE_X_FORWARDED_FOR = not DEBUG
+RATE_LIMITS = {
+    'login': [('ip', '10/min'), ('ip', '100/hour')],
+    'token_obtain_pair': [('ip', '10/min'), ('ip', '100/hour')],
+    'register': [('ip', '5/min')],
+    'token_refresh': [('ip', '30/min')],
+    'add_to_cart': [('session', '60/min'), ('user', '60/min'), ('ip', '300/min')],
+    'checkout': [('session', '10/min'), ('user', '10/min'), ('ip', '30/min')],
+}
+
+# Order event outbox (drained by `manage.py process_order_events`)
+ORDER_EVENT_HANDLERS = [
+    path.strip() for path in
+    os.environ.get('ORDER_EVENT_HANDLERS', 'stores.outbox.log_event').split(',')
+    if path.strip()
+]
+ORDER_EVENT_WEBHOOK_URL = os.environ.get('ORDER_EVENT_WEBHOOK_URL')
+ORDER_EVENT_MAX_ATTEMPTS = int(os.environ.get('ORDER_EVENT_MAX_ATTEMPTS', '5'))
+ORDER_EVENT_RETRY_BASE_SECONDS = int(os.environ.get('ORDER_EVENT_RETRY_BASE_SECONDS', '10'))
+
+# Live order feed (GET /api/store/<id>/orders/events/). PollingBroker also picks up
+# events from other workers and nodes within ORDER_FEED_POLL_INTERVAL; LocalBroker
+# only wakes connections in the same process (single-process dev servers and tests).
+ORDER_FEED_BROKER = os.environ.get('ORDER_FEED_BROKER', 'stores.order_feed.PollingBroker')
+ORDER_FEED_POLL_INTERVAL = 2
+ORDER_FEED_HEARTBEAT_SECONDS = 15
+ORDER_FEED_MAX_SECONDS = 300
+ORDER_FEED_POLL_TIMEOUT = 25
+# Longest an order transaction is expected to stay open: on Postgres, events are only
+# handed out once no lower id can still commit, or they are this many seconds old
+ORDER_FEED_COMMIT_LAG = int(os.environ.get('ORDER_FEED_COMMIT_LAG', 5))
+# Under WSGI the feed never holds a worker thread waiting: it answers at once and
+# clients poll again after this many seconds
+ORDER_FEED_WSGI_RETRY_SECONDS = int(os.environ.get('ORDER_FEED_WSGI_RETRY_SECONDS', 5))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'stores': {'handlers': ['console'], 'level': 'INFO'},
+        'taskqueue': {'handlers': ['console'], 'level': 'INFO'},
+        'storebuilder.requests': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'storebuilder.cdn': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+# Per-request SQL/timing instrumentation (storebuilder.instrumentation)
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'True') == 'True'
+# Server-Timing exposes query counts to clients, so it's off in production unless asked for
+REQUEST_METRICS_SERVER_TIMING = os.environ.get('REQUEST_METRICS_SERVER_TIMING', str(DEBUG)) == 'True'
+# Same query signature this many times in one request counts as an N+1
+REQUEST_METRICS_DUPLICATE_THRESHOLD = int(os.environ.get('REQUEST_METRICS_DUPLICATE_THRESHOLD', 3))
+# Fraction of requests that keep stacks of repeated queries, logged if the request is slow or query-heavy
+REQUEST_METRICS_STACK_SAMPLE_RATE = float(os.environ.get('REQUEST_METRICS_STACK_SAMPLE_RATE', 0.01))
+REQUEST_METRICS_SLOW_MS = int(os.environ.get('REQUEST_METRICS_SLOW_MS', 1000))
+REQUEST_METRICS_SLOW_QUERY_COUNT = int(os.environ.get('REQUEST_METRICS_SLOW_QUERY_COUNT', 50))
+
+# Prometheus /metrics (storebuilder.metrics). Set PROMETHEUS_MULTIPROC_DIR when
+# running several worker processes; startup.sh does this for gunicorn.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+# Scrapers must send "Authorization: Bearer <METRICS_TOKEN>"; without a token
+# /metrics is only served when DEBUG is on
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Response compression (storebuilder.compression): brotli when the package is
+# installed, else gzip. Levels favour speed; these are compressed per request.
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'True') == 'True'
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+# Prefix match on the response's media type; text/event-stream is deliberately absent
+COMPRESSION_CONTENT_TYPES = [
+    'application/json', 'application/x-ndjson', 'application/javascript', 'image/svg+xml',
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+]
+# Responses carrying tokens are never compressed (BREACH)
+COMPRESSION_EXCLUDE_VIEWS = ['login', 'register', 'token_obtain_pair', 'token_refresh', 'get_csrf_token']
+# Per-process memory for compressed copies of repeated bodies; 0 disables
+COMPRESSION_CACHE_BYTES = int(os.environ.get('COMPRESSION_CACHE_BYTES', 16 * 1024 * 1024))
+
 
 # CORS settings - allow all origins in debug mode
 if DEBUG:
@@ -224,3 +431,81 @@ CSRF_TRUSTED_ORIGINS = [
 
     
 CORS_ALLOW_HEADERS = list(default_headers) + ["authorization", "content-type"]
+
+# What each public catalog response depends on, formatted with the URL kwargs:
+# "store-<id>" (a store and its products), "product-<id>", "owner-<user id>" (a
+# user's stores), "stores" and "products" (the full lists). stores.signals
+# invalidates them in the CDN and the response cache when stores and products change.
+CACHE_TAGS = {
+    'store-list': ['stores'],
+    'store-detail': ['store-{pk}'],
+    'store-products': ['store-{pk}'],
+    'product-list': ['products'],
+    'product-detail': ['product-{pk}'],
+    'get_user_stores': ['owner-{user_id}'],
+}
+
+# Edge caching of the public catalog (storebuilder.cdn): the CDN keeps these
+# responses for s_maxage seconds, tagged with CACHE_TAGS for purging; browsers get max_age.
+CDN_CACHE_ENABLED = os.environ.get('CDN_CACHE_ENABLED', 'True') == 'True'
+CDN_CACHE_POLICIES = {
+    'store-list': {'s_maxage': 300, 'stale_while_revalidate': 60},
+    'store-detail': {'s_maxage': 3600, 'stale_while_revalidate': 60},
+    'store-products': {'s_maxage': 3600, 'stale_while_revalidate': 60},
+    'product-list': {'s_maxage': 300, 'stale_while_revalidate': 60},
+    'product-detail': {'s_maxage': 3600, 'stale_while_revalidate': 60},
+    'get_user_stores': {'s_maxage': 3600, 'stale_while_revalidate': 60},
+}
+# Cloudflare reads Cache-Tag instead
+CDN_SURROGATE_KEY_HEADER = os.environ.get('CDN_SURROGATE_KEY_HEADER', 'Surrogate-Key')
+# storebuilder.cdn.LocalPurgeClient only records purges; use FastlyPurgeClient behind Fastly
+CDN_PURGE_CLIENT = os.environ.get('CDN_PURGE_CLIENT', 'storebuilder.cdn.LocalPurgeClient')
+CDN_FASTLY_SERVICE_ID = os.environ.get('CDN_FASTLY_SERVICE_ID', '')
+CDN_FASTLY_API_TOKEN = os.environ.get('CDN_FASTLY_API_TOKEN', '')
+
+# Server-side cache of anonymous catalog responses (storebuilder.response_cache):
+# url name -> seconds. Invalidation by CACHE_TAGS reaches every process only
+# through a shared cache (REDIS_URL); otherwise these bound how stale other workers get.
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'True') == 'True'
+RESPONSE_CACHE_VIEWS = {
+    'store-list': 60,
+    'store-detail': 300,
+    'store-products': 300,
+    'product-list': 60,
+    'product-detail': 300,
+    'get_user_stores': 300,
+}
+# Also keep response bodies in the default cache, for processes to share
+RESPONSE_CACHE_SHARED = os.environ.get('RESPONSE_CACHE_SHARED', str(bool(os.environ.get('REDIS_URL')))) == 'True'
+RESPONSE_CACHE_LOCAL_BYTES = int(os.environ.get('RESPONSE_CACHE_LOCAL_BYTES', 32 * 1024 * 1024))
+# How long one request may hold a key's recompute lock, and others wait for it
+RESPONSE_CACHE_LOCK_TIMEOUT = 5
+# XFetch beta: above 1 refreshes earlier, 0 only at expiry
+RESPONSE_CACHE_EARLY_BETA = 1.0
+
+# Background tasks (taskqueue.queue.enqueue, run by `manage.py run_tasks`).
+# TASK_TYPES: per task function defaults, e.g.
+#   {'stores.tasks.export_orders': {'priority': -1, 'max_attempts': 3, 'concurrency': 2}}
+TASK_TYPES = {}
+TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS', 5))
+TASK_RETRY_BASE_SECONDS = int(os.environ.get('TASK_RETRY_BASE_SECONDS', 10))
+# A task is claimed again this long after its worker's last heartbeat
+TASK_LEASE_SECONDS = int(os.environ.get('TASK_LEASE_SECONDS', 60))
+TASK_HEARTBEAT_SECONDS = int(os.environ.get('TASK_HEARTBEAT_SECONDS', 10))
+TASK_RETENTION_DAYS = int(os.environ.get('TASK_RETENTION_DAYS', 7))
+
+# Request profiling (storebuilder.profiling): staff send "X-Profile: 1", or a
+# PROFILING_SAMPLE_RATE fraction of requests to PROFILING_VIEWS (url names; all if empty)
+# is profiled. Staff list and download profiles at /api/profiles/.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'True') == 'True'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_VIEWS = [name for name in os.environ.get('PROFILING_VIEWS', '').split(',') if name]
+# auto: pyinstrument (sampling) when installed, else cProfile
+PROFILING_ENGINE = os.environ.get('PROFILING_ENGINE', 'auto')
+PROFILING_DIR = os.environ.get('PROFILING_DIR', '')
+PROFILING_MAX_PROFILES = int(os.environ.get('PROFILING_MAX_PROFILES', 50))
+PROFILING_TOP_FUNCTIONS = 30
+
+# Admin changelists on Postgres show the planner's row estimate instead of an
+# exact count once it reaches this many rows (storebuilder.pagination)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(os.environ.get('ADMIN_ESTIMATED_COUNT_THRESHOLD', 100000))
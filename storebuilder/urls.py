@@ -19,10 +19,17 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+from .profiling import profile_detail, profile_download, profile_list
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('auth_api.urls')),
+    path('api/profiles/', profile_list, name='profile_list'),
+    path('api/profiles/<str:profile_id>/', profile_detail, name='profile_detail'),
+    path('api/profiles/<str:profile_id>/download/', profile_download, name='profile_download'),
     path('api/', include('stores.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files in all environments
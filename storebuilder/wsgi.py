@@ -10,7 +10,12 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'storebuilder.settings')
 
 application = get_wsgi_application()
+
+# Import the URLconf, and with it every view and serializer, now instead of on the
+# first request; under gunicorn's preload_app that happens once, in the master
+get_resolver().url_patterns
@@ -1,22 +1,81 @@
 from django.contrib import admin
-from .models import Store, Product, Order, OrderItem
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.auth.models import User
+from storebuilder.pagination import EstimatedCountPaginator
+from .models import Store, Product, Order, OrderItem, OrderEvent
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Sidebar filter with a text box, for relations with too many rows to list"""
+    template = 'admin/input_filter.html'
+    placeholder = ''
+
+    def lookups(self, request, model_admin):
+        # Never rendered, but the filter is hidden without any
+        return [('', '')]
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        # Submitting the box keeps the other filters, search and ordering, and starts from page one
+        all_choice['query_parts'] = [(name, value) for name, value in changelist.params.items()
+                                     if name not in (self.parameter_name, PAGE_VAR)]
+        yield all_choice
+
+
+class StoreFilter(InputFilter):
+    """Store id, or the start of a store name"""
+    title = 'store'
+    parameter_name = 'store'
+    placeholder = 'Id or name'
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(store_id=value)
+        return queryset.filter(store__in=Store.objects.filter(name__istartswith=value))
+
+
+class OwnerFilter(InputFilter):
+    """Owner id or exact username"""
+    title = 'owner'
+    parameter_name = 'owner'
+    placeholder = 'Id or username'
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(owner_id=value)
+        return queryset.filter(owner__in=User.objects.filter(username=value))
 
 
 @admin.register(Store)
 class StoreAdmin(admin.ModelAdmin):
     list_display = ['name', 'owner', 'created_at']
-    list_filter = ['created_at', 'owner']
-    search_fields = ['name', 'owner__username']
+    list_filter = ['created_at', OwnerFilter]
+    list_select_related = ['owner']
+    # Prefix search on the indexed name, also behind the store autocompletes
+    search_fields = ['^name']
     readonly_fields = ['created_at', 'updated_at']
-    
+    raw_id_fields = ['owner']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'store', 'price', 'stock', 'created_at']
-    list_filter = ['store', 'created_at']
-    search_fields = ['name', 'store__name', 'description']
+    list_filter = [StoreFilter, 'created_at']
+    list_select_related = ['store']
+    search_fields = ['^name']
     readonly_fields = ['created_at', 'updated_at']
     list_editable = ['price', 'stock']
+    autocomplete_fields = ['store']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class OrderItemInline(admin.TabularInline):
@@ -24,14 +83,44 @@ class OrderItemInline(admin.TabularInline):
     extra = 0
     readonly_fields = ['product', 'quantity', 'price']
 
+    def get_queryset(self, request):
+        # Product.__str__ includes its store's name
+        return super().get_queryset(request).select_related('product__store')
+
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'customer', 'store', 'status', 'total_amount', 'created_at']
-    list_filter = ['status', 'store', 'created_at']
-    search_fields = ['customer__username', 'store__name']
+    list_filter = ['status', StoreFilter, 'created_at']
+    list_select_related = ['customer', 'store']
+    search_fields = ['id', 'guest_email', 'customer__username']
+    search_help_text = 'Order number, customer username or email address'
     readonly_fields = ['customer', 'store', 'total_amount', 'created_at', 'updated_at']
     inlines = [OrderItemInline]
-    
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     def has_add_permission(self, request):
         return False  # Orders should only be created through API
+
+    def get_search_results(self, request, queryset, search_term):
+        # Exact matches only, each served by an index: substring search over every order can't be
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.lstrip('#').isdigit():
+            return queryset.filter(id=term.lstrip('#')), False
+        if '@' in term:
+            customers = User.objects.filter(email__iexact=term)
+            return queryset.filter(guest_email__iexact=term) | queryset.filter(customer__in=customers), False
+        return queryset.filter(customer__in=User.objects.filter(username=term)), False
+
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event_type', 'store', 'order', 'state', 'attempts', 'created_at']
+    list_filter = ['state', 'event_type']
+    list_select_related = ['store', 'order__customer']
+    readonly_fields = ['event_type', 'store', 'order', 'payload', 'completed_handlers', 'created_at', 'processed_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
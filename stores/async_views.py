@@ -0,0 +1,95 @@
+"""
+Async versions of the catalog and cart read endpoints, used when serving under
+ASGI (SERVER_MODE=asgi). Queries go through Django's async ORM with everything
+the serializers touch prefetched, so serialization itself never hits the DB.
+Other methods on the same URLs fall through to the regular DRF views.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser, User
+from django.db.models import Count
+from django.http import HttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+
+from auth_api.authentication import aauthenticate_request, authentication_failed_response
+
+from .cart_service import CartService
+from .models import Cart, Product, Store
+from .serializers import CartSerializer, ProductSerializer, StoreListSerializer, StoreSerializer
+
+
+def _json(data, status=200):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def _not_found(model):
+    return _json({'detail': f'No {model.__name__} matches the given query.'}, status=404)
+
+
+def read_view(async_view, sync_view):
+    """Serve GET/HEAD with async_view and every other method with the sync DRF view"""
+    sync_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await sync_view(request, *args, **kwargs)
+
+    # The DRF views handle CSRF themselves
+    view.csrf_exempt = True
+    return view
+
+
+async def store_list(request):
+    stores = Store.objects.annotate(num_products=Count('products'))
+    serializer = StoreListSerializer([store async for store in stores], many=True, context={'request': request})
+    return _json(serializer.data)
+
+
+async def store_retrieve(request, pk):
+    try:
+        store = await Store.objects.prefetch_related('products').aget(pk=pk)
+    except (Store.DoesNotExist, ValueError):
+        return _not_found(Store)
+    return _json(StoreSerializer(store, context={'request': request}).data)
+
+
+async def store_products(request, pk):
+    if not await Store.objects.filter(pk=pk).aexists():
+        return _not_found(Store)
+    products = [product async for product in Product.objects.filter(store_id=pk)]
+    return _json(ProductSerializer(products, many=True, context={'request': request}).data)
+
+
+async def product_list(request):
+    products = [product async for product in Product.objects.all()]
+    return _json(ProductSerializer(products, many=True, context={'request': request}).data)
+
+
+async def product_retrieve(request, pk):
+    try:
+        product = await Product.objects.aget(pk=pk)
+    except (Product.DoesNotExist, ValueError):
+        return _not_found(Product)
+    return _json(ProductSerializer(product, context={'request': request}).data)
+
+
+async def get_user_stores(request, user_id):
+    if not await User.objects.filter(id=user_id).aexists():
+        return _json({'error': 'User not found'}, status=404)
+    stores = Store.objects.filter(owner_id=user_id).annotate(num_products=Count('products')).order_by('name')
+    serializer = StoreListSerializer([store async for store in stores], many=True, context={'request': request})
+    return _json(serializer.data)
+
+
+async def get_cart(request):
+    """Get current cart with all items"""
+    try:
+        request.user = await aauthenticate_request(request) or AnonymousUser()
+    except AuthenticationFailed as exc:
+        # An expired token must not fall back to a guest cart: the client refreshes it on 401
+        return authentication_failed_response(request, exc)
+    # Resolving a guest cart may touch the session store and create the cart row
+    cart = await sync_to_async(CartService(request).get_or_create_cart)()
+    cart = await Cart.objects.prefetch_related('items__product').aget(pk=cart.pk)
+    return _json(CartSerializer(cart, context={'request': request}).data)
@@ -1,24 +1,51 @@
-from django.contrib.sessions.backends.base import SessionBase
+import re
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.utils.crypto import get_random_string
 from .models import Cart, CartItem, Product
 from django.db import transaction
 
 
+# Session entry holding the guest cart's key; independent of the session backend's own key
+GUEST_CART_SESSION_KEY = 'cart_key'
+# Session keys issued by the database/cache session backends
+LEGACY_SESSION_KEY_RE = re.compile(r'^[a-z0-9]{32}$')
+
+
 class CartService:
     def __init__(self, request):
         self.request = request
         self.session = request.session
         self.user = request.user if request.user.is_authenticated else None
+    
+    def _legacy_cart_key(self):
+        """Key of a guest cart created under the old DB sessions, where Cart.session_key was the session id"""
+        if not getattr(settings, 'CART_ADOPT_LEGACY_SESSIONS', True):
+            return None
+        cookie = self.request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+        if LEGACY_SESSION_KEY_RE.match(cookie) and Cart.objects.filter(session_key=cookie, user__isnull=True).exists():
+            return cookie
+        return None
+    
+    def get_guest_cart_key(self, create=False):
+        """Get the guest cart key stored in the session, optionally issuing a new one"""
+        key = self.session.get(GUEST_CART_SESSION_KEY)
+        if key:
+            return key
+        key = self._legacy_cart_key()
+        if key is None:
+            if not create:
+                return None
+            key = get_random_string(32, allowed_chars='abcdefghijklmnopqrstuvwxyz0123456789')
+        self.session[GUEST_CART_SESSION_KEY] = key
+        return key
         
     def get_or_create_cart(self):
         """Get or create cart for authenticated user or guest session"""
         if self.user:
-            cart, created = Cart.objects.get_or_create(user=self.user)
+            cart, created = Cart.objects.get_or_create(user_id=self.user.id)
         else:
-            # Ensure session exists
-            if not self.session.session_key:
-                self.session.create()
-            cart, created = Cart.objects.get_or_create(session_key=self.session.session_key)
+            cart, created = Cart.objects.get_or_create(session_key=self.get_guest_cart_key(create=True))
         return cart
     
     def add_item(self, product_id, quantity=1):
@@ -119,6 +146,9 @@ class CartService:
     
     def transfer_cart_on_login(self):
         """Transfer guest cart to user cart on login"""
-        if self.session.session_key:
-            return self.merge_guest_cart_to_user(self.session.session_key)
+        guest_cart_key = self.get_guest_cart_key()
+        if guest_cart_key:
+            merged = self.merge_guest_cart_to_user(guest_cart_key)
+            self.session.pop(GUEST_CART_SESSION_KEY, None)
+            return merged
         return False
\ No newline at end of file
@@ -11,6 +11,7 @@ from .serializers import (
     CreateGuestOrderSerializer, OrderSerializer
 )
 from .models import Order, OrderItem
+from .outbox import record_order_created
 
 
 @api_view(['GET'])
@@ -152,7 +153,7 @@ def checkout(request):
             # Create separate order for each store
             for store_data in stores_items.values():
                 order = Order.objects.create(
-                    customer=request.user if request.user.is_authenticated else None,
+                    customer_id=request.user.id if request.user.is_authenticated else None,
                     guest_email=serializer.validated_data.get('guest_email'),
                     guest_name=serializer.validated_data.get('guest_name'),
                     store=store_data['store'],
@@ -173,6 +174,8 @@ def checkout(request):
                 
                 orders.append(order)
             
+            record_order_created(orders)
+            
             # Clear cart after successful order creation
             cart_service.clear_cart()
             
@@ -0,0 +1,124 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed
+
+from auth_api.authentication import aauthenticate_request, authentication_failed_response
+
+from .models import Store
+from .order_feed import events_after, get_broker, latest_event_id
+
+
+def _parse_cursor(request):
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('cursor')
+    if cursor is None:
+        return None
+    try:
+        return max(int(cursor), 0)
+    except ValueError:
+        raise ValueError('Invalid cursor')
+
+
+def _format_event(event):
+    data = json.dumps({'type': event['event_type'], 'created_at': event['created_at'], **event['payload']},
+                      cls=DjangoJSONEncoder)
+    return f"id: {event['id']}\nevent: {event['event_type']}\ndata: {data}\n\n"
+
+
+async def _wait_for_events(listener, store_id, cursor, timeout):
+    """Events after cursor, waiting up to timeout seconds for some to arrive"""
+    deadline = time.monotonic() + timeout
+    while True:
+        # Cleared before querying, so a publish during the query still wakes the wait below
+        listener.clear()
+        events = await events_after(store_id, cursor)
+        remaining = deadline - time.monotonic()
+        if events or remaining <= 0:
+            return events
+        # Events held back until they settle (order_feed.settled_id) publish nothing further
+        await listener.wait(min(remaining, getattr(settings, 'ORDER_FEED_COMMIT_LAG', 5)))
+
+
+async def _event_stream(store_id, cursor):
+    heartbeat = getattr(settings, 'ORDER_FEED_HEARTBEAT_SECONDS', 15)
+    # Close periodically so clients reconnect with Last-Event-ID and stale connections are dropped
+    deadline = time.monotonic() + getattr(settings, 'ORDER_FEED_MAX_SECONDS', 300)
+    yield 'retry: 3000\n\n'
+    with get_broker().listen(store_id) as listener:
+        while time.monotonic() < deadline:
+            timeout = max(min(heartbeat, deadline - time.monotonic()), 0)
+            events = await _wait_for_events(listener, store_id, cursor, timeout)
+            for event in events:
+                cursor = event['id']
+                yield _format_event(event)
+            if not events:
+                yield ': keep-alive\n\n'
+
+
+@require_GET
+async def order_events_feed(request, store_id):
+    """Server-sent events of order created/status changes for a store (store owner only)
+
+    Resume from an event id with the Last-Event-ID header or ?cursor=; without one
+    only events after the connection opens are sent. ?mode=poll long-polls instead
+    and returns a JSON batch as soon as one is available. Under WSGI neither waits:
+    each request returns the events there are now, and the client polls again after
+    retry_after seconds (the SSE retry: field for EventSource).
+    """
+    try:
+        user = await aauthenticate_request(request)
+    except AuthenticationFailed as exc:
+        return authentication_failed_response(request, exc)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+
+    owner_id = await Store.objects.filter(id=store_id).values_list('owner_id', flat=True).afirst()
+    if owner_id is None:
+        return JsonResponse({'error': 'Store not found'}, status=404)
+    if owner_id != user.id:
+        return JsonResponse({'error': 'You do not have permission to view this store\'s orders'}, status=403)
+
+    try:
+        cursor = _parse_cursor(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if cursor is None:
+        cursor = await latest_event_id(store_id)
+
+    # Under WSGI every waiting connection holds one of a few worker threads, so nothing waits:
+    # each request answers with what's there now and tells the client when to come back
+    wsgi = not isinstance(request, ASGIRequest)
+    retry = getattr(settings, 'ORDER_FEED_WSGI_RETRY_SECONDS', 5)
+
+    if request.GET.get('mode') == 'poll':
+        if wsgi:
+            events = await events_after(store_id, cursor)
+        else:
+            with get_broker().listen(store_id) as listener:
+                events = await _wait_for_events(listener, store_id, cursor,
+                                                getattr(settings, 'ORDER_FEED_POLL_TIMEOUT', 25))
+        return JsonResponse({
+            'cursor': events[-1]['id'] if events else cursor,
+            'retry_after': retry if wsgi else 0,
+            'events': [
+                {'id': e['id'], 'type': e['event_type'], 'created_at': e['created_at'], **e['payload']}
+                for e in events
+            ]
+        })
+
+    if wsgi:
+        # A WSGI server drains a streaming response before sending any of it, so send one batch
+        # in SSE form; EventSource reconnects after the retry delay with Last-Event-ID
+        events = await events_after(store_id, cursor)
+        body = f'retry: {retry * 1000}\n\n' + (''.join(_format_event(event) for event in events) or ': keep-alive\n\n')
+        response = HttpResponse(body, content_type='text/event-stream')
+    else:
+        response = StreamingHttpResponse(_event_stream(store_id, cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
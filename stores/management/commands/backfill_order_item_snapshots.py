@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from stores.models import OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Copy product name, image and description onto order items created before snapshots existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        total = 0
+        while True:
+            batch = list(
+                OrderItem.objects.filter(id__gt=last_id, product_name='')
+                .select_related('product')
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+            for item in batch:
+                item.snapshot_product()
+            OrderItem.objects.bulk_update(batch, ['product_name', 'product_image', 'product_description'])
+            last_id = batch[-1].id
+            total += len(batch)
+            self.stdout.write(f'Backfilled {total} order item(s)')
+        self.stdout.write(self.style.SUCCESS(f'Done: {total} order item(s) updated'))
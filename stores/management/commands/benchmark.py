@@ -0,0 +1,296 @@
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import Resolver404, resolve
+
+from auth_api.tokens import UserClaimsRefreshToken
+from storebuilder.benchmarking import percentile
+from stores.models import Product, Store
+
+from .loadtest import SERVER_MODES, start_server
+
+
+BENCH_PREFIX = 'bench_'
+SERVER_TIMING_QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def endpoint_name(method, path):
+    """'GET /api/stores/12/' -> 'GET store-detail', so ids don't split the stats"""
+    try:
+        match = resolve(path.split('?')[0])
+    except Resolver404:
+        return f'{method} unresolved'
+    return f'{method} {match.url_name or match.route}'
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)   # endpoint -> [(ms, queries or None)]
+        self.errors = defaultdict(int)
+
+    def add(self, endpoint, elapsed_ms, queries, ok):
+        with self.lock:
+            self.samples[endpoint].append((elapsed_ms, queries))
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint in sorted(set(self.samples) | set(self.errors)):
+            samples = self.samples.get(endpoint, [])
+            timings = [ms for ms, _ in samples] or [0]
+            queries = [q for _, q in samples if q is not None]
+            endpoints[endpoint] = {
+                'count': len(samples),
+                'errors': self.errors.get(endpoint, 0),
+                'p50': percentile(timings, 50),
+                'p95': percentile(timings, 95),
+                'p99': percentile(timings, 99),
+                'queries': sum(queries) / len(queries) if queries else None,
+            }
+        total = sum(len(samples) for samples in self.samples.values())
+        return {'elapsed': elapsed, 'requests': total, 'throughput': total / elapsed if elapsed else 0,
+                'endpoints': endpoints}
+
+
+class Client:
+    """One virtual user: keeps its own cookies and optional bearer token"""
+
+    def __init__(self, base_url, recorder, token=None):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.token = token
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor())
+
+    def request(self, method, path, body=None, token=None):
+        token = token or self.token
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        start = time.perf_counter()
+        try:
+            response = self.opener.open(request, timeout=60)
+            status, payload, timing = response.status, response.read(), response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as e:
+            status, payload, timing = e.code, e.read(), e.headers.get('Server-Timing', '')
+        except (urllib.error.URLError, ConnectionError):
+            status, payload, timing = None, b'', ''
+        elapsed = (time.perf_counter() - start) * 1000
+        match = SERVER_TIMING_QUERIES_RE.search(timing)
+        self.recorder.add(endpoint_name(method, path), elapsed, int(match.group(1)) if match else None,
+                          status is not None and status < 400)
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+
+def shopper_flow(client, owner_client, store_ids, product_ids, rng):
+    """Browse a store, add to cart, check out, and have the owner approve the orders"""
+    store_id = rng.choice(store_ids)
+    client.request('GET', '/api/stores/')
+    client.request('GET', f'/api/stores/{store_id}/')
+    client.request('GET', f'/api/stores/{store_id}/products/')
+    for product_id in rng.sample(product_ids, rng.randint(1, 3)):
+        client.request('POST', '/api/cart/add/', {'product_id': product_id, 'quantity': 1})
+    client.request('GET', '/api/cart/')
+    status, body = client.request('POST', '/api/cart/checkout/', {'shipping_address': '1 Bench St', 'phone': '555'})
+    if status == 201:
+        for order in body['orders']:
+            owner_client.request('POST', f'/api/orders/{order["id"]}/approve/')
+
+
+def load_replay(path):
+    """(method, path) of replayable requests in a storebuilder.requests log; non-JSON lines are skipped"""
+    requests, skipped = [], 0
+    with open(path) as f:
+        for line in f:
+            # Tolerate a logging prefix before the JSON object
+            start = line.find('{')
+            try:
+                entry = json.loads(line[start:]) if start >= 0 else None
+            except ValueError:
+                entry = None
+            if not isinstance(entry, dict) or 'method' not in entry or 'path' not in entry:
+                continue
+            # Request bodies aren't logged, so only reads can be replayed faithfully
+            if entry['method'] in ('GET', 'HEAD') and not entry['path'].endswith('/events/'):
+                requests.append((entry['method'], entry['path']))
+            else:
+                skipped += 1
+    return requests, skipped
+
+
+def run_clients(concurrency, duration, work):
+    """Call work(n, stop_at) in concurrency threads; returns elapsed seconds"""
+    stop_at = time.monotonic() + duration
+    started = time.monotonic()
+    threads = [threading.Thread(target=work, args=(n, stop_at)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.monotonic() - started
+
+
+class Command(BaseCommand):
+    help = ('End-to-end benchmark against a local gunicorn (or --url). Runs the scripted shopper flow '
+            '(browse store, add to cart, checkout, owner approves) and, with --replay, a storebuilder.requests '
+            'log. Reports throughput, latency percentiles and queries per request per endpoint, and compares '
+            'with --baseline, failing on regressions. Run generate_data first for a production-shaped database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server using this database (needs '
+                                          'REQUEST_METRICS_SERVER_TIMING=True for query counts)')
+        parser.add_argument('--mode', choices=SERVER_MODES, default='gthread', help='Server to spawn without --url')
+        parser.add_argument('--workers', type=int, help='Default: auto-sized by storebuilder.gunicorn_conf')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=20.0, help='Seconds per scenario')
+        parser.add_argument('--replay', help='Log file of storebuilder.requests JSON lines to replay')
+        parser.add_argument('--skip-flows', action='store_true', help='Only run --replay')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--baseline', help='Compare with results saved by --save-baseline')
+        parser.add_argument('--save-baseline', help='Write this run\'s results as JSON')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative slowdown of p95/throughput before flagging a regression')
+
+    def handle(self, *args, **options):
+        if options['skip_flows'] and not options['replay']:
+            raise CommandError('--skip-flows needs --replay')
+        replay = None
+        if options['replay']:
+            replay, skipped = load_replay(options['replay'])
+            if not replay:
+                raise CommandError(f'No replayable requests in {options["replay"]}')
+            self.stdout.write(f'Replaying {len(replay)} requests ({skipped} non-GET entries skipped)')
+
+        self.fixture_user_ids = []
+        server = None
+        try:
+            fixtures = self.create_fixtures(options['concurrency'])
+            if options['url']:
+                base_url = options['url'].rstrip('/')
+            else:
+                server, base_url = start_server(options['mode'], options['workers'], REQUEST_METRICS_SERVER_TIMING='True')
+            results = {}
+            if not options['skip_flows']:
+                results['flows'] = self.run_flows(base_url, fixtures, options)
+            if replay:
+                results['replay'] = self.run_replay(base_url, replay, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+            self.delete_fixtures()
+
+        for scenario, result in results.items():
+            self.report(scenario, result)
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write(f'Baseline written to {options["save_baseline"]}')
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                regressions = self.compare(json.load(f), results, options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
+
+    def create_fixtures(self, shoppers):
+        """A store the benchmark owns, so checkouts have an owner to approve them, plus one user per client"""
+        # Names unique to this run: an existing user is never reused, and so never deleted afterwards
+        prefix = f'{BENCH_PREFIX}{uuid.uuid4().hex[:8]}_'
+        owner = User.objects.create_user(f'{prefix}owner')
+        self.fixture_user_ids.append(owner.id)
+        store = Store.objects.create(name='Benchmark store', owner=owner)
+        Product.objects.bulk_create([
+            Product(name=f'Benchmark product {n}', store=store, price=Decimal('9.99'), stock=10 ** 9)
+            for n in range(20)
+        ])
+        users = []
+        for n in range(shoppers):
+            users.append(User.objects.create_user(f'{prefix}shopper_{n}'))
+            self.fixture_user_ids.append(users[-1].id)
+        store_ids = list(Store.objects.order_by('-id').values_list('id', flat=True)[:500])
+        return {
+            'owner_token': str(UserClaimsRefreshToken.for_user(owner).access_token),
+            'shopper_tokens': [str(UserClaimsRefreshToken.for_user(user).access_token) for user in users],
+            'store_ids': store_ids,
+            'product_ids': list(store.products.values_list('id', flat=True)),
+        }
+
+    def delete_fixtures(self):
+        # Only the users this run created; cascades to the benchmark store, its orders and the shoppers' carts
+        User.objects.filter(id__in=self.fixture_user_ids).delete()
+
+    def run_flows(self, base_url, fixtures, options):
+        recorder = Recorder()
+
+        def work(n, stop_at):
+            rng = random.Random(options['seed'] + n)
+            client = Client(base_url, recorder, fixtures['shopper_tokens'][n])
+            owner_client = Client(base_url, recorder, fixtures['owner_token'])
+            while time.monotonic() < stop_at:
+                shopper_flow(client, owner_client, fixtures['store_ids'], fixtures['product_ids'], rng)
+
+        return recorder.summary(run_clients(options['concurrency'], options['duration'], work))
+
+    def run_replay(self, base_url, replay, options):
+        recorder = Recorder()
+
+        def work(n, stop_at):
+            # Each client walks the log from its own offset, looping until time is up
+            client = Client(base_url, recorder)
+            i = n * len(replay) // options['concurrency']
+            while time.monotonic() < stop_at:
+                client.request(*replay[i % len(replay)])
+                i += 1
+
+        return recorder.summary(run_clients(options['concurrency'], options['duration'], work))
+
+    def report(self, scenario, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{scenario}: {result["throughput"]:.1f} req/s ({result["requests"]} requests in {result["elapsed"]:.1f}s)'
+        ))
+        self.stdout.write(f'  {"endpoint":<36}{"count":>7}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+                          f'{"queries":>9}{"errors":>8}')
+        for endpoint, stats in result['endpoints'].items():
+            queries = f'{stats["queries"]:.1f}' if stats['queries'] is not None else '-'
+            self.stdout.write(f'  {endpoint:<36}{stats["count"]:>7}{stats["p50"]:>9.1f}{stats["p95"]:>9.1f}'
+                              f'{stats["p99"]:>9.1f}{queries:>9}{stats["errors"]:>8}')
+
+    def compare(self, baseline, results, tolerance):
+        regressions = []
+        for scenario, result in results.items():
+            before = baseline.get(scenario)
+            if before is None:
+                continue
+            if result['throughput'] < before['throughput'] * (1 - tolerance):
+                regressions.append(f'{scenario}: throughput {result["throughput"]:.1f} req/s, '
+                                   f'baseline {before["throughput"]:.1f}')
+            for endpoint, stats in result['endpoints'].items():
+                old = before['endpoints'].get(endpoint)
+                if old is None:
+                    continue
+                if stats['p95'] > old['p95'] * (1 + tolerance):
+                    regressions.append(f'{scenario} {endpoint}: p95 {stats["p95"]:.1f}ms, baseline {old["p95"]:.1f}ms')
+                # Query counts don't depend on the machine, so any real increase counts
+                if stats['queries'] is not None and old['queries'] is not None and stats['queries'] > old['queries'] + 0.5:
+                    regressions.append(f'{scenario} {endpoint}: {stats["queries"]:.1f} queries/request, '
+                                       f'baseline {old["queries"]:.1f}')
+                if stats['errors'] > old['errors'] and stats['errors'] > stats['count'] * 0.01:
+                    regressions.append(f'{scenario} {endpoint}: {stats["errors"]} errors, baseline {old["errors"]}')
+        return regressions
@@ -0,0 +1,124 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from storebuilder.benchmarking import percentile
+from stores.models import Product, Store
+
+
+# Environment for each database mode; sqlite modes get a fresh temporary file
+MODES = {
+    'sqlite-default': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_TUNING': 'False'},
+    'sqlite-tuned': {'DB_ENGINE': 'sqlite', 'DB_SQLITE_TUNING': 'True'},
+    'postgres': {'DB_ENGINE': 'postgres', 'DB_POOL': 'False'},
+    'postgres-pool': {'DB_ENGINE': 'postgres', 'DB_POOL': 'True'},
+}
+
+
+class Command(BaseCommand):
+    help = ('Compare write throughput of concurrent add-to-cart + checkout flows across database modes. '
+            'Each mode runs in a subprocess; sqlite modes get a fresh temporary database, postgres modes '
+            'use DB_* from the environment with DB_NAME taken from --postgres-db, which is migrated and '
+            'written to. Fixtures are created under names unique to the run and deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=['sqlite-default', 'sqlite-tuned'])
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent shoppers')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per mode')
+        parser.add_argument('--postgres-db', default='storebuilder_bench')
+        parser.add_argument('--run', action='store_true', help='Internal: run one mode in this process')
+
+    def handle(self, *args, **options):
+        if options['run']:
+            self.stdout.write(json.dumps(self.run(options['threads'], options['duration'])))
+            return
+
+        self.stdout.write(f'{"mode":<16}{"checkouts/s":>12}{"ok":>8}{"failed":>8}{"p50 ms":>10}{"p95 ms":>10}')
+        for mode in options['modes']:
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, RATE_LIMIT_ENABLED='False', **MODES[mode])
+                env['DB_NAME'] = (os.path.join(tmp, 'bench.sqlite3') if env['DB_ENGINE'] == 'sqlite'
+                                  else options['postgres_db'])
+                manage = [sys.executable, str(settings.BASE_DIR / 'manage.py')]
+                subprocess.run(manage + ['migrate', '--noinput', '-v', '0'], env=env, check=True)
+                result = subprocess.run(
+                    manage + ['benchmark_checkout', '--run', '--threads', str(options['threads']),
+                              '--duration', str(options['duration'])],
+                    env=env, check=True, capture_output=True, text=True,
+                )
+            try:
+                stats = json.loads(result.stdout.strip().splitlines()[-1])
+            except (IndexError, ValueError):
+                raise CommandError(f'{mode} run produced no result:\n{result.stderr}')
+            self.stdout.write(
+                f'{mode:<16}{stats["ok"] / stats["elapsed"]:>12.1f}{stats["ok"]:>8}{stats["failed"]:>8}'
+                f'{stats["p50"]:>10.1f}{stats["p95"]:>10.1f}'
+            )
+
+    @override_settings(RATE_LIMIT_ENABLED=False)
+    def run(self, threads, duration):
+        # The postgres database outlives the run, so fixture names must not collide with an earlier one's
+        prefix = f'bench_{uuid.uuid4().hex[:8]}_'
+        owner = User.objects.create_user(f'{prefix}owner')
+        shoppers = [User.objects.create_user(f'{prefix}shopper_{n}') for n in range(threads)]
+        try:
+            return self.checkouts(owner, shoppers, duration)
+        finally:
+            # Cascades to the benchmark store, its orders and the shoppers' carts
+            User.objects.filter(id__in=[owner.id] + [user.id for user in shoppers]).delete()
+
+    def checkouts(self, owner, shoppers, duration):
+        store = Store.objects.create(name='Benchmark store', owner=owner)
+        products = [Product(name=f'Product {i}', store=store, price=10, stock=1000) for i in range(20)]
+        Product.objects.bulk_create(products)
+        product_ids = list(Product.objects.filter(store=store).values_list('id', flat=True))
+
+        timings = []
+        failures = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def shop(user):
+            # Lock errors should count as failed checkouts, not kill the shopper
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(user)
+            i = user.id
+            try:
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    for product_id in (product_ids[i % len(product_ids)], product_ids[(i + 7) % len(product_ids)]):
+                        client.post('/api/cart/add/', {'product_id': product_id, 'quantity': 1}, format='json')
+                    response = client.post('/api/cart/checkout/', {'shipping_address': '1 Bench St', 'phone': '0'},
+                                           format='json')
+                    elapsed = (time.perf_counter() - start) * 1000
+                    with lock:
+                        (timings if response.status_code == 201 else failures).append(elapsed)
+                    i += 1
+            finally:
+                connection.close()
+
+        started = time.monotonic()
+        workers = [threading.Thread(target=shop, args=(user,)) for user in shoppers]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return {
+            'elapsed': time.monotonic() - started,
+            'ok': len(timings),
+            'failed': len(failures),
+            'p50': percentile(timings, 50) if timings else 0,
+            'p95': percentile(timings, 95) if timings else 0,
+        }
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from storebuilder.query_budgets import check_query_budgets
+
+
+class Command(BaseCommand):
+    help = ('Request every stores/auth_api route against throwaway fixtures (rolled back) and fail if any '
+            'runs more queries than its budget in storebuilder.query_budgets.QUERY_BUDGETS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('routes', nargs='*', help='Route names to check (default: all)')
+
+    def handle(self, *args, **options):
+        results, failures = check_query_budgets(options['routes'])
+        self.stdout.write(f'{"route":<28}{"method":<8}{"status":>7}{"queries":>9}{"budget":>8}')
+        for name, method, status_code, queries, budget in results:
+            line = f'{name:<28}{method:<8}{status_code:>7}{queries:>9}{budget:>8}'
+            self.stdout.write(self.style.ERROR(line) if queries > budget or status_code >= 400 else line)
+        if failures:
+            raise CommandError('Query budgets failed:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} requests within budget'))
@@ -0,0 +1,44 @@
+import hashlib
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+
+MANIFEST_NAME = '.collectstatic.sha256'
+
+
+def static_sources_hash():
+    """Hash of every file collectstatic would copy (name and content) plus the storage it copies to"""
+    digest = hashlib.sha256(repr(settings.STORAGES.get('staticfiles')).encode())
+    files = {}
+    for finder in get_finders():
+        for path, storage in finder.list(['CVS', '.*', '*~']):
+            # Like collectstatic, the first finder to provide a path wins
+            files.setdefault(path, storage)
+    for path in sorted(files):
+        digest.update(path.encode() + b'\0')
+        with files[path].open(path) as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = ('Run collectstatic only when the static files (or their storage) changed since the last run, '
+            f'tracked by a hash in STATIC_ROOT/{MANIFEST_NAME}.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true')
+
+    def handle(self, *args, **options):
+        manifest = Path(settings.STATIC_ROOT) / MANIFEST_NAME
+        current = static_sources_hash()
+        if not options['force'] and manifest.exists() and manifest.read_text().strip() == current:
+            self.stdout.write('Static files unchanged; skipping collectstatic')
+            return
+        call_command('collectstatic', interactive=False, verbosity=options['verbosity'])
+        manifest.parent.mkdir(parents=True, exist_ok=True)
+        manifest.write_text(current)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from stores.models import Store
+from stores.order_export import EXPORT_FORMATS, parse_bound, stream_orders
+
+
+class Command(BaseCommand):
+    help = 'Stream a store\'s orders with their items as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('store_id', type=int)
+        parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--start', help='Only orders created on or after this ISO date/datetime')
+        parser.add_argument('--end', help='Only orders created on or before this ISO date/datetime')
+        parser.add_argument('--status', help='Only orders with this status')
+        parser.add_argument('--output', '-o', help='Write to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if not Store.objects.filter(id=options['store_id']).exists():
+            raise CommandError(f'Store {options["store_id"]} not found')
+
+        try:
+            stream = stream_orders(
+                options['store_id'],
+                export_format=options['export_format'],
+                start=parse_bound(options['start']),
+                end=parse_bound(options['end'], end=True),
+                status=options['status'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as out:
+                out.writelines(stream)
+        else:
+            for chunk in stream:
+                self.stdout.write(chunk, ending='')
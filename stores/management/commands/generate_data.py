@@ -0,0 +1,292 @@
+import itertools
+import random
+import re
+import time
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from stores.models import Cart, CartItem, Order, OrderItem, Product, Store
+
+
+KEY_CHARS = 'abcdefghijklmnopqrstuvwxyz0123456789'
+# Generated users and guest orders get emails under <prefix>.GENERATED_DOMAIN; .invalid is reserved, so no
+# real account has one
+GENERATED_DOMAIN = 'generated.invalid'
+ADJECTIVES = ['Classic', 'Organic', 'Handmade', 'Vintage', 'Premium', 'Compact', 'Deluxe', 'Rustic', 'Modern', 'Eco']
+NOUNS = ['Mug', 'Lamp', 'Notebook', 'Scarf', 'Candle', 'Backpack', 'Teapot', 'Poster', 'Wallet', 'Planter',
+         'Headphones', 'Blanket', 'Soap', 'Knife', 'Chair']
+STREETS = ['Main St', 'Oak Ave', 'Market St', 'Station Rd', 'High St', 'Park Lane', 'River Rd']
+
+
+class Zipf:
+    """Weighted picker where item k (0-based) is 1/(k+1)^s as likely as the first; O(log n) per draw"""
+
+    def __init__(self, items, s, rng):
+        self.items = items
+        self.rng = rng
+        self.cum = list(itertools.accumulate(1 / (k + 1) ** s for k in range(len(items))))
+
+    def pick(self):
+        return self.items[bisect(self.cum, self.rng.random() * self.cum[-1])]
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the created_at/updated_at values we set instead of stamping now()"""
+    fields = [f for model in models for f in model._meta.fields if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)]
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = ('Generate a reproducible, production-shaped data set: users, stores, products with skewed '
+            'popularity, user and guest carts, and orders with items spread over --days. The same --seed '
+            'on the same day produces the same data. Generated users have emails @<prefix>.generated.invalid and '
+            'guest carts and sessions have keys "<prefix>-..." (real keys never contain "-"), so --clear '
+            'removes exactly the generated rows and everything that belongs to them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='gen', help='Lowercase letters and digits tagging the generated data')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--stores', type=int, default=50)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--carts', type=int, default=200, help='Users with an open cart')
+        parser.add_argument('--guest-carts', type=int, default=500)
+        parser.add_argument('--guest-order-ratio', type=float, default=0.2)
+        parser.add_argument('--days', type=int, default=365, help='Orders are spread over this many past days')
+        parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent for product popularity')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated data with this prefix first')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        if not re.fullmatch(r'[a-z0-9]{1,20}', self.prefix):
+            # A "-" or "." in the prefix would let one prefix's tag match another's
+            raise CommandError('--prefix must be up to 20 lowercase letters and digits')
+        self.domain = f'{self.prefix}.{GENERATED_DOMAIN}'
+        # Anchored to the start of today so reruns on the same day are identical
+        self.now = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = self.now - timedelta(days=options['days'])
+        self.snapshots = {}
+
+        if options['clear']:
+            self.clear()
+        elif self.generated_users().exists():
+            raise CommandError(f'Data with prefix "{self.prefix}" already exists; use --clear or another --prefix')
+        if options['users'] < 1 or options['stores'] < 1 or options['products'] < options['stores']:
+            raise CommandError('Need at least one user, one store and one product per store')
+
+        with explicit_timestamps(User, Store, Product, Cart, CartItem, Order):
+            users = self.step('users', self.create_users)
+            stores = self.step('stores', self.create_stores, users)
+            products = self.step('products', self.create_products, stores)
+            self.build_popularity(users, products)
+            self.step('carts', self.create_carts, users)
+            self.step('orders', self.create_orders, users)
+
+    def step(self, label, func, *args):
+        started = time.monotonic()
+        result = func(*args)
+        count = result if isinstance(result, int) else len(result)
+        self.stdout.write(f'{label}: {count} in {time.monotonic() - started:.1f}s')
+        return result
+
+    def generated_users(self):
+        return User.objects.filter(email__endswith=f'@{self.domain}')
+
+    def clear(self):
+        # Generated stores, products and orders all hang off generated users
+        users = self.generated_users()
+        with transaction.atomic():
+            Order.objects.filter(store__owner__in=users).delete()
+            Cart.objects.filter(session_key__startswith=f'{self.prefix}-').delete()
+            Session.objects.filter(session_key__startswith=f'{self.prefix}-').delete()
+            Store.objects.filter(owner__in=users).delete()
+            users.delete()
+
+    def bulk_create(self, model, objs):
+        created = []
+        for i in range(0, len(objs), self.batch_size):
+            with transaction.atomic():
+                created += model.objects.bulk_create(objs[i:i + self.batch_size])
+        return created
+
+    def random_time(self, start=None, end=None):
+        start = start or self.start
+        end = end or self.now
+        return start + (end - start) * self.rng.random()
+
+    def key(self):
+        # Same length as CartService guest keys; the "-" sets them apart from any real key for --clear
+        return f'{self.prefix}-' + ''.join(self.rng.choices(KEY_CHARS, k=31 - len(self.prefix)))
+
+    def create_users(self):
+        # One hash for everyone: hashing a million passwords would take hours
+        password = make_password('storebuilder', salt='generated', hasher='default')
+        users = []
+        for n in range(self.options['users']):
+            joined = self.random_time(self.start - timedelta(days=180))
+            users.append(User(username=f'{self.prefix}_user_{n:07d}', email=f'user{n}@{self.domain}',
+                              password=password, date_joined=joined, last_login=joined))
+        return self.bulk_create(User, users)
+
+    def create_stores(self, users):
+        owners = users[:max(1, self.options['stores'])]
+        stores = []
+        for n in range(self.options['stores']):
+            created = self.random_time(self.start - timedelta(days=365), self.start)
+            stores.append(Store(name=f'{self.prefix} store {n:05d}', owner=owners[n % len(owners)],
+                                created_at=created, updated_at=created))
+        return self.bulk_create(Store, stores)
+
+    def create_products(self, stores):
+        # Store sizes are skewed too: a few big shops, a long tail of small ones
+        store_picker = Zipf(stores, 0.8, self.rng)
+        assignments = stores + [store_picker.pick() for _ in range(self.options['products'] - len(stores))]
+        products = []
+        for n, store in enumerate(assignments):
+            created = self.random_time(store.created_at, self.start)
+            name = f'{self.rng.choice(ADJECTIVES)} {self.rng.choice(NOUNS)} {n}'
+            products.append(Product(
+                name=name, store=store, description=f'{name} from {store.name}.',
+                price=Decimal(self.rng.randint(199, 19999)) / 100, stock=self.rng.randint(0, 500),
+                created_at=created, updated_at=created,
+            ))
+        return self.bulk_create(Product, products)
+
+    def build_popularity(self, users, products):
+        skew = self.options['skew']
+        ranked = products[:]
+        self.rng.shuffle(ranked)
+        self.product_picker = Zipf(ranked, skew, self.rng)
+        rank = {product.id: k for k, product in enumerate(ranked)}
+        by_store = {}
+        for product in ranked:
+            by_store.setdefault(product.store_id, []).append(product)
+        # Within a store, the same global ranking applies
+        self.store_pickers = {
+            store_id: Zipf(sorted(items, key=lambda p: rank[p.id]), skew, self.rng)
+            for store_id, items in by_store.items()
+        }
+        # A minority of customers place most of the orders
+        customers = users[:]
+        self.rng.shuffle(customers)
+        self.customer_picker = Zipf(customers, 0.7, self.rng)
+
+    def basket(self, first=None):
+        """1-5 distinct products from one store, popular ones more likely"""
+        first = first or self.product_picker.pick()
+        picker = self.store_pickers[first.store_id]
+        wanted = min(len(picker.items), self.rng.choices([1, 2, 3, 4, 5], weights=[45, 25, 15, 10, 5])[0])
+        chosen = {first.id: first}
+        for _ in range(wanted * 4):
+            if len(chosen) >= wanted:
+                break
+            product = picker.pick()
+            chosen.setdefault(product.id, product)
+        return list(chosen.values())
+
+    def create_carts(self, users):
+        carts = []
+        owners = self.rng.sample(users, min(self.options['carts'], len(users)))
+        for user in owners:
+            updated = self.random_time(self.now - timedelta(days=14))
+            carts.append(Cart(user=user, created_at=updated, updated_at=updated))
+        for _ in range(self.options['guest_carts']):
+            updated = self.random_time(self.now - timedelta(days=30))
+            carts.append(Cart(session_key=self.key(), created_at=updated, updated_at=updated))
+        carts = self.bulk_create(Cart, carts)
+
+        items = []
+        for cart in carts:
+            for product in self.basket():
+                items.append(CartItem(cart=cart, product=product, quantity=self.rng.randint(1, 3),
+                                      created_at=cart.created_at, updated_at=cart.updated_at))
+        self.bulk_create(CartItem, items)
+
+        if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.db':
+            # Guest carts are found through the session; give each one a live DB session
+            store = Session.get_session_store_class()()
+            self.bulk_create(Session, [
+                Session(session_key=self.key(), session_data=store.encode({'cart_key': cart.session_key}),
+                        expire_date=self.now + timedelta(days=14))
+                for cart in carts if cart.session_key
+            ])
+        return carts
+
+    def snapshot(self, product):
+        """OrderItem snapshot fields for product, computed once per product"""
+        if product.id not in self.snapshots:
+            item = OrderItem()
+            item.snapshot_product(product)
+            self.snapshots[product.id] = {'product_name': item.product_name, 'product_image': item.product_image,
+                                          'product_description': item.product_description}
+        return self.snapshots[product.id]
+
+    def order_status(self, created):
+        age = (self.now - created).days
+        if age < 2:
+            return self.rng.choices(['pending', 'confirmed', 'cancelled'], weights=[70, 25, 5])[0]
+        if age < 7:
+            return self.rng.choices(['confirmed', 'shipped', 'delivered', 'cancelled'], weights=[10, 45, 38, 7])[0]
+        return self.rng.choices(['delivered', 'cancelled'], weights=[92, 8])[0]
+
+    def create_orders(self, users):
+        total = self.options['orders']
+        span = self.now - self.start
+        created_count = 0
+        for batch_start in range(0, total, self.batch_size):
+            orders, baskets = [], []
+            for n in range(batch_start, min(total, batch_start + self.batch_size)):
+                # Ascending in time like real ids, with volume growing towards the present
+                created = self.start + span * ((n + self.rng.random()) / total) ** (1 / 1.5)
+                basket = [(product, self.rng.choices([1, 2, 3], weights=[80, 15, 5])[0]) for product in self.basket()]
+                order = Order(
+                    store_id=basket[0][0].store_id,
+                    status=self.order_status(created),
+                    total_amount=sum(product.price * quantity for product, quantity in basket),
+                    shipping_address=f'{self.rng.randint(1, 999)} {self.rng.choice(STREETS)}',
+                    phone=f'555{self.rng.randint(0, 9999999):07d}',
+                    created_at=created,
+                    updated_at=created + timedelta(hours=self.rng.randint(0, 72)),
+                )
+                if self.rng.random() < self.options['guest_order_ratio']:
+                    order.guest_email = f'guest{n}@{self.domain}'
+                    order.guest_name = f'Guest {n}'
+                else:
+                    order.customer = self.customer_picker.pick()
+                orders.append(order)
+                baskets.append(basket)
+
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                items = []
+                for order, basket in zip(orders, baskets):
+                    for product, quantity in basket:
+                        items.append(OrderItem(order=order, product=product, quantity=quantity,
+                                               price=product.price, **self.snapshot(product)))
+                OrderItem.objects.bulk_create(items)
+            created_count += len(orders)
+            self.stdout.write(f'  {created_count}/{total} orders')
+        return created_count
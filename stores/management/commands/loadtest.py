@@ -0,0 +1,146 @@
+import http.cookiejar
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from storebuilder.benchmarking import percentile
+from stores.models import Store
+
+
+# Environment selecting each worker model in storebuilder.gunicorn_conf
+SERVER_MODES = {
+    'wsgi': {'SERVER_MODE': 'wsgi', 'GUNICORN_WORKER_CLASS': 'sync'},
+    'gthread': {'SERVER_MODE': 'wsgi', 'GUNICORN_WORKER_CLASS': 'gthread'},
+    'asgi': {'SERVER_MODE': 'asgi'},
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'{base_url}/api/stores/', timeout=2).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise CommandError(f'Server at {base_url} did not become ready')
+
+
+def start_server(mode, workers=None, **env):
+    """Start gunicorn on a free port with storebuilder.gunicorn_conf in mode; returns (process, base_url)"""
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, RATE_LIMIT_ENABLED='False', **SERVER_MODES[mode], **env)
+    command = [sys.executable, '-m', 'gunicorn', '--config', 'python:storebuilder.gunicorn_conf',
+               '--bind', f'127.0.0.1:{port}']
+    if workers:
+        command += ['--workers', str(workers)]
+    server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(base_url)
+    except CommandError:
+        server.terminate()
+        raise
+    return server, base_url
+
+
+def run_load(base_url, paths, concurrency, duration):
+    """Hit paths round-robin from concurrency clients for duration seconds; returns (elapsed, timings, errors)"""
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        # One cookie jar per client so guest carts are reused like a real browser
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        local_timings = defaultdict(list)
+        local_errors = defaultdict(int)
+        i = offset
+        while time.monotonic() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                opener.open(base_url + path, timeout=30).read()
+                local_timings[path].append((time.perf_counter() - start) * 1000)
+            except (urllib.error.URLError, ConnectionError):
+                local_errors[path] += 1
+        with lock:
+            for path, samples in local_timings.items():
+                timings[path].extend(samples)
+            for path, count in local_errors.items():
+                errors[path] += count
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.monotonic() - started, timings, errors
+
+
+class Command(BaseCommand):
+    help = ('Load test the catalog and cart read endpoints. Either point it at a running server with --url, '
+            'or let it start gunicorn in each --modes (sync wsgi, gthread, asgi) on this machine and compare throughput.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of an already running server')
+        parser.add_argument('--modes', nargs='+', choices=SERVER_MODES, default=['wsgi', 'gthread', 'asgi'])
+        parser.add_argument('--workers', type=int, help='gunicorn workers per spawned server (default: auto-sized)')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per run')
+        parser.add_argument('--paths', nargs='+', help='Paths to request (default: catalog and cart reads)')
+
+    def default_paths(self):
+        store = Store.objects.order_by('id').first()
+        paths = ['/api/stores/', '/api/products/', '/api/cart/']
+        if store is not None:
+            paths += [f'/api/stores/{store.id}/', f'/api/stores/{store.id}/products/',
+                      f'/api/user/{store.owner_id}/stores/']
+        return paths
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or self.default_paths()
+        if options['url']:
+            self.report(options['url'], *run_load(options['url'].rstrip('/'), paths,
+                                                  options['concurrency'], options['duration']))
+            return
+
+        for mode in options['modes']:
+            server, base_url = start_server(mode, options['workers'])
+            try:
+                self.report(mode, *run_load(base_url, paths, options['concurrency'], options['duration']))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    def report(self, label, elapsed, timings, errors):
+        total = sum(len(samples) for samples in timings.values())
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{label}: {total / elapsed:.1f} req/s ({total} requests, {sum(errors.values())} errors in {elapsed:.1f}s)'
+        ))
+        self.stdout.write(f'  {"path":<40}{"count":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+        for path in sorted(set(timings) | set(errors)):
+            samples = timings.get(path) or [0]
+            self.stdout.write(
+                f'  {path:<40}{len(timings.get(path, [])):>8}{percentile(samples, 50):>10.1f}'
+                f'{percentile(samples, 95):>10.1f}{percentile(samples, 99):>10.1f}{errors.get(path, 0):>8}'
+            )
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from stores.outbox import get_handlers, process_batch
+
+
+class Command(BaseCommand):
+    help = 'Drain the order event outbox, dispatching each event to ORDER_EVENT_HANDLERS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Process a single batch and exit')
+
+    def handle(self, *args, **options):
+        handlers = get_handlers()
+        while True:
+            succeeded, failed = process_batch(options['batch_size'], handlers)
+            if succeeded or failed:
+                self.stdout.write(f'Processed {succeeded} event(s), {failed} failed')
+            if options['once']:
+                return
+            if not succeeded and not failed:
+                time.sleep(options['interval'])
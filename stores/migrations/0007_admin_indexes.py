@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:32
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+# "^name" admin search is UPPER(name) LIKE 'X%' on Postgres, which a plain
+# index can't serve outside the C locale
+PATTERN_INDEXES = [
+    ('stores_store_name_upper_pattern', 'stores_store'),
+    ('stores_product_name_upper_pattern', 'stores_product'),
+]
+
+
+def create_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table in PATTERN_INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} (UPPER(name::text) text_pattern_ops)')
+
+
+def drop_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in PATTERN_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0006_orderitem_product_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created_at'], name='stores_orde_created_665de8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['store', '-created_at'], name='stores_orde_store_i_148bc0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-created_at'], name='stores_orde_status_5c6f4a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(django.db.models.functions.text.Upper('guest_email'), name='stores_order_guest_email_upper'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name'], name='stores_prod_name_f67284_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(fields=['name'], name='stores_stor_name_988b60_idx'),
+        ),
+        migrations.RunPython(create_pattern_indexes, drop_pattern_indexes),
+    ]
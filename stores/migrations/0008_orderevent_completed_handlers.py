@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stores', '0007_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderevent',
+            name='completed_handlers',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
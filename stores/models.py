@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
+from django.utils.text import Truncator
 from django.contrib.auth.models import User
 
 
@@ -10,6 +13,7 @@ class Store(models.Model):
     
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=['name'])]
         
     def __str__(self):
         return self.name
@@ -27,6 +31,7 @@ class Product(models.Model):
     
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=['name'])]
         
     def __str__(self):
         return f"{self.name} - {self.store.name}"
@@ -41,6 +46,14 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
     ]
     
+    # Target status -> statuses an order may move to it from
+    ALLOWED_TRANSITIONS = {
+        'confirmed': ['pending'],
+        'shipped': ['confirmed'],
+        'delivered': ['shipped'],
+        'cancelled': ['pending', 'confirmed', 'shipped'],
+    }
+    
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders', null=True, blank=True)
     guest_email = models.EmailField(null=True, blank=True)
     guest_name = models.CharField(max_length=100, null=True, blank=True)
@@ -56,6 +69,14 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Newest first, overall and within a store or status (admin changelist, store order list)
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['store', '-created_at']),
+            models.Index(fields=['status', '-created_at']),
+            # Case-insensitive exact email search
+            models.Index(Upper('guest_email'), name='stores_order_guest_email_upper'),
+        ]
         
     def __str__(self):
         if self.customer:
@@ -68,12 +89,63 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Product details as they were when the order was placed
+    product_name = models.CharField(max_length=200, blank=True)
+    product_image = models.CharField(max_length=500, blank=True)
+    product_description = models.CharField(max_length=255, blank=True)
     
     class Meta:
         unique_together = ['order', 'product']
         
     def __str__(self):
-        return f"{self.quantity}x {self.product.name}"
+        return f"{self.quantity}x {self.product_name}"
+    
+    def snapshot_product(self, product=None):
+        """Copy the product's display fields onto this item"""
+        product = product or self.product
+        self.product_name = product.name
+        self.product_image = product.image.url if product.image else ''
+        self.product_description = Truncator(product.description).chars(255)
+    
+    def save(self, *args, **kwargs):
+        if not self.pk and not self.product_name:
+            self.snapshot_product()
+        super().save(*args, **kwargs)
+
+
+class OrderEvent(models.Model):
+    """Outbox row written in the same transaction as the order change it describes"""
+    CREATED = 'order.created'
+    STATUS_CHANGED = 'order.status_changed'
+    EVENT_CHOICES = [
+        (CREATED, 'Order created'),
+        (STATUS_CHANGED, 'Order status changed'),
+    ]
+    STATE_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    event_type = models.CharField(max_length=50, choices=EVENT_CHOICES)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='order_events')
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, related_name='events', null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # Dotted paths of the handlers that have run; a retry skips them
+    completed_handlers = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['state', 'available_at'])]
+        
+    def __str__(self):
+        return f"{self.event_type} #{self.id} ({self.state})"
 
 
 class Cart(models.Model):
@@ -0,0 +1,113 @@
+import csv
+import json
+from datetime import datetime, time
+
+from django.db import router
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order, OrderItem
+
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_CHUNK_SIZE = 2000
+
+ORDER_FIELDS = [
+    'order_id', 'created_at', 'status', 'customer', 'guest_email', 'guest_name',
+    'total_amount', 'shipping_address', 'phone', 'notes',
+]
+ITEM_FIELDS = ['item_id', 'product_id', 'product_name', 'quantity', 'price']
+
+_ROW_COLUMNS = [
+    'order_id', 'order__created_at', 'order__status', 'order__customer__username',
+    'order__guest_email', 'order__guest_name', 'order__total_amount',
+    'order__shipping_address', 'order__phone', 'order__notes',
+    'id', 'product_id', 'product_name', 'quantity', 'price',
+]
+
+
+class _Echo:
+    """File-like object whose write() returns the value instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def parse_bound(value, end=False):
+    """Parse an ISO date or datetime export bound, returning an aware datetime"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value}')
+        parsed = datetime.combine(day, time.max if end else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def get_export_rows(store_id, start=None, end=None, status=None):
+    """One flat tuple per order item, grouped by order and streamed in chunks"""
+    # Bind the database now: the rows are read after the view (and its routing context) has returned
+    items = OrderItem.objects.using(router.db_for_read(OrderItem)).filter(order__store_id=store_id)
+    if start:
+        items = items.filter(order__created_at__gte=start)
+    if end:
+        items = items.filter(order__created_at__lte=end)
+    if status:
+        valid_statuses = [choice[0] for choice in Order.STATUS_CHOICES]
+        if status not in valid_statuses:
+            raise ValueError(f'Invalid status. Valid choices: {valid_statuses}')
+        items = items.filter(order__status=status)
+    return items.order_by('order_id', 'id').values_list(*_ROW_COLUMNS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _split_row(row):
+    order = dict(zip(ORDER_FIELDS, row[:len(ORDER_FIELDS)]))
+    if not order['customer']:
+        order['customer'] = order['guest_name'] or order['guest_email']
+    item = dict(zip(ITEM_FIELDS, row[len(ORDER_FIELDS):]))
+    return order, item
+
+
+def _to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def stream_csv(rows):
+    """Yield CSV lines, one per order item, header first"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(ORDER_FIELDS + ITEM_FIELDS)
+    for row in rows:
+        order, item = _split_row(row)
+        yield writer.writerow([_to_text(v) for v in list(order.values()) + list(item.values())])
+
+
+def stream_jsonl(rows):
+    """Yield JSON lines, one per order with its items nested"""
+    current = None
+    for row in rows:
+        order, item = _split_row(row)
+        if current is None or current['order_id'] != order['order_id']:
+            if current is not None:
+                yield json.dumps(current, default=_to_text) + '\n'
+            current = dict(order, items=[])
+        current['items'].append(item)
+    if current is not None:
+        yield json.dumps(current, default=_to_text) + '\n'
+
+
+def stream_orders(store_id, export_format='csv', start=None, end=None, status=None):
+    """Stream a store's orders in the requested format in constant memory"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Invalid format. Valid choices: {list(EXPORT_FORMATS)}')
+    rows = get_export_rows(store_id, start=start, end=end, status=status)
+    if export_format == 'jsonl':
+        return stream_jsonl(rows)
+    return stream_csv(rows)
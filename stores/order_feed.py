@@ -0,0 +1,141 @@
+import asyncio
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OrderEvent
+
+
+class Listener:
+    """A feed connection's subscription to a store; registered before the outbox is queried"""
+
+    def __init__(self, broker, store_id):
+        self.broker = broker
+        self.store_id = store_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def __enter__(self):
+        self.broker.add(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.broker.discard(self)
+
+    def clear(self):
+        """Forget earlier wakeups; call before each query of the outbox"""
+        self.event.clear()
+
+    async def wait(self, timeout):
+        """Return True if the store was published to since the last clear(), waiting up to timeout seconds"""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class LocalBroker:
+    """In-process pub/sub: wakes feed connections in this process when a store gets new events
+
+    Listeners subscribe before querying and clear() before each query, so an event
+    published in between still wakes them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = {}
+
+    def listen(self, store_id):
+        return Listener(self, store_id)
+
+    def add(self, listener):
+        with self._lock:
+            self._listeners.setdefault(listener.store_id, set()).add(listener)
+
+    def discard(self, listener):
+        with self._lock:
+            listeners = self._listeners.get(listener.store_id)
+            if listeners is not None:
+                listeners.discard(listener)
+                if not listeners:
+                    del self._listeners[listener.store_id]
+
+    def publish(self, store_id):
+        # May be called from a sync worker thread, so wake each listener on its own loop
+        with self._lock:
+            listeners = list(self._listeners.get(store_id, ()))
+        for listener in listeners:
+            listener.loop.call_soon_threadsafe(listener.event.set)
+
+
+class PollingListener(Listener):
+    async def wait(self, timeout):
+        # Events published by other processes are only seen by querying again
+        await super().wait(min(self.broker.poll_interval, timeout))
+        return True
+
+
+class PollingBroker(LocalBroker):
+    """Multi-process broker: wakes local connections at once, and re-checks the outbox
+    table every poll interval for events published by other workers and nodes"""
+
+    def __init__(self, poll_interval=None):
+        super().__init__()
+        self.poll_interval = poll_interval or getattr(settings, 'ORDER_FEED_POLL_INTERVAL', 2)
+
+    def listen(self, store_id):
+        return PollingListener(self, store_id)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(getattr(settings, 'ORDER_FEED_BROKER', 'stores.order_feed.PollingBroker'))()
+    return _broker
+
+
+async def settled_id():
+    """Highest event id at or below which no more events can appear; None where ids commit in order
+
+    Ids are taken at insert but become visible at commit, so on Postgres a lower id can
+    show up after a higher one. A cursor that had already passed it would never see it.
+    Anything inserted more than ORDER_FEED_COMMIT_LAG seconds ago is taken to have committed
+    or rolled back; above that, ids are only settled up to the first gap.
+    """
+    if connections[OrderEvent.objects.all().db].vendor == 'sqlite':
+        # One writer at a time: ids become visible in order
+        return None
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'ORDER_FEED_COMMIT_LAG', 5))
+    floor = await (OrderEvent.objects.filter(created_at__lte=cutoff).order_by('-id')
+                   .values_list('id', flat=True).afirst()) or 0
+    expected = floor + 1
+    async for event_id in OrderEvent.objects.filter(id__gt=floor).order_by('id').values_list('id', flat=True):
+        if event_id != expected:
+            break
+        expected += 1
+    return expected - 1
+
+
+async def latest_event_id(store_id):
+    events = OrderEvent.objects.filter(store_id=store_id)
+    horizon = await settled_id()
+    if horizon is not None:
+        events = events.filter(id__lte=horizon)
+    return await events.order_by('-id').values_list('id', flat=True).afirst() or 0
+
+
+async def events_after(store_id, cursor, limit=100):
+    """Settled events for a store with id greater than cursor, oldest first"""
+    events = OrderEvent.objects.filter(store_id=store_id, id__gt=cursor).order_by('id')
+    horizon = await settled_id()
+    if horizon is not None:
+        events = events.filter(id__lte=horizon)
+    return [event async for event in events.values('id', 'event_type', 'payload', 'created_at')[:limit]]
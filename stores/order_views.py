@@ -4,8 +4,14 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django.db import transaction
 from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from .models import Order, OrderItem, Product, Store
-from .serializers import OrderSerializer, CreateGuestOrderSerializer, OrderItemSerializer
+from .order_export import parse_bound, stream_orders
+from .outbox import record_order_created, record_status_changed
+from .serializers import (
+    OrderSerializer, CreateGuestOrderSerializer, OrderItemSerializer, BulkOrderStatusSerializer
+)
 
 
 @api_view(['POST'])
@@ -63,7 +69,7 @@ def create_order(request):
             # Create separate order for each store
             for store_data in stores_items.values():
                 order = Order.objects.create(
-                    customer=request.user if request.user.is_authenticated else None,
+                    customer_id=request.user.id if request.user.is_authenticated else None,
                     guest_email=serializer.validated_data.get('guest_email'),
                     guest_name=serializer.validated_data.get('guest_name'),
                     store=store_data['store'],
@@ -83,6 +89,8 @@ def create_order(request):
                     )
                 
                 orders.append(order)
+            
+            record_order_created(orders)
     
     except Exception as e:
         return Response({'error': 'Failed to create order'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -99,14 +107,16 @@ def create_order(request):
 @permission_classes([IsAuthenticated])
 def get_user_orders(request):
     """Get all orders for authenticated user"""
-    orders = Order.objects.filter(customer=request.user).order_by('-created_at')
+    orders = Order.objects.filter(customer_id=request.user.id).order_by('-created_at')
     
     # Optional filtering by status
     status_filter = request.GET.get('status')
     if status_filter:
         orders = orders.filter(status=status_filter)
     
-    serializer = OrderSerializer(orders, many=True, context={'request': request})
+    serializer = OrderSerializer(
+        orders.select_related('customer', 'store').prefetch_related('items'), many=True, context={'request': request}
+    )
     return Response({
         'count': orders.count(),
         'orders': serializer.data
@@ -123,7 +133,7 @@ def get_store_orders(request, store_id):
         return Response({'error': 'Store not found'}, status=status.HTTP_404_NOT_FOUND)
     
     # Check if user owns the store
-    if store.owner != request.user:
+    if store.owner_id != request.user.id:
         return Response({'error': 'You do not have permission to view this store\'s orders'}, 
                        status=status.HTTP_403_FORBIDDEN)
     
@@ -134,7 +144,9 @@ def get_store_orders(request, store_id):
     if status_filter:
         orders = orders.filter(status=status_filter)
     
-    serializer = OrderSerializer(orders, many=True, context={'request': request})
+    serializer = OrderSerializer(
+        orders.select_related('customer', 'store').prefetch_related('items'), many=True, context={'request': request}
+    )
     return Response({
         'store_name': store.name,
         'count': orders.count(),
@@ -142,6 +154,38 @@ def get_store_orders(request, store_id):
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_store_orders(request, store_id):
+    """Stream all orders for a store as CSV or JSONL (store owner only)"""
+    try:
+        store = Store.objects.get(id=store_id)
+    except Store.DoesNotExist:
+        return Response({'error': 'Store not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    # Check if user owns the store
+    if store.owner_id != request.user.id:
+        return Response({'error': 'You do not have permission to export this store\'s orders'}, 
+                       status=status.HTTP_403_FORBIDDEN)
+    
+    export_format = request.GET.get('output', 'csv')
+    try:
+        stream = stream_orders(
+            store.id,
+            export_format=export_format,
+            start=parse_bound(request.GET.get('start')),
+            end=parse_bound(request.GET.get('end'), end=True),
+            status=request.GET.get('status'),
+        )
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="store-{store.id}-orders.{export_format}"'
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_order_detail(request, order_id):
@@ -154,7 +198,7 @@ def get_order_detail(request, order_id):
     # Check permissions
     if request.user.is_authenticated:
         # User can see their own orders or orders from their stores
-        if order.customer != request.user and order.store.owner != request.user:
+        if order.customer_id != request.user.id and order.store.owner_id != request.user.id:
             return Response({'error': 'You do not have permission to view this order'}, 
                            status=status.HTTP_403_FORBIDDEN)
     else:
@@ -167,6 +211,29 @@ def get_order_detail(request, order_id):
     return Response(serializer.data)
 
 
+def _change_status(order, new_status, **fields):
+    """
+    Move order from the status it was read with to new_status and queue the event.
+    Conditional on that status, so of two concurrent requests only one changes the
+    order and records an event; returns False for the other.
+    """
+    previous_status = order.status
+    fields.update(status=new_status, updated_at=timezone.now())
+    with transaction.atomic():
+        if not Order.objects.filter(id=order.id, status=previous_status).update(**fields):
+            return False
+        for name, value in fields.items():
+            setattr(order, name, value)
+        record_status_changed([order], {order.id: previous_status})
+    return True
+
+
+def _status_conflict(order):
+    order.refresh_from_db(fields=['status'])
+    return Response({'error': f'Order status was changed meanwhile; it is now {order.status}'},
+                    status=status.HTTP_409_CONFLICT)
+
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def update_order_status(request, order_id):
@@ -177,7 +244,7 @@ def update_order_status(request, order_id):
         return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
     
     # Check if user owns the store
-    if order.store.owner != request.user:
+    if order.store.owner_id != request.user.id:
         return Response({'error': 'You do not have permission to update this order'}, 
                        status=status.HTTP_403_FORBIDDEN)
     
@@ -191,8 +258,16 @@ def update_order_status(request, order_id):
         return Response({'error': f'Invalid status. Valid choices: {valid_statuses}'}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
-    order.status = new_status
-    order.save()
+    if new_status == order.status:
+        # Nothing changes, so no event (and no customer email) either
+        serializer = OrderSerializer(order, context={'request': request})
+        return Response({
+            'message': 'Order status unchanged',
+            'order': serializer.data
+        })
+    
+    if not _change_status(order, new_status):
+        return _status_conflict(order)
     
     serializer = OrderSerializer(order, context={'request': request})
     return Response({
@@ -211,7 +286,7 @@ def approve_order(request, order_id):
         return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
     
     # Check if user owns the store
-    if order.store.owner != request.user:
+    if order.store.owner_id != request.user.id:
         return Response({'error': 'You do not have permission to approve this order'}, 
                        status=status.HTTP_403_FORBIDDEN)
     
@@ -221,8 +296,8 @@ def approve_order(request, order_id):
                        status=status.HTTP_400_BAD_REQUEST)
     
     # Approve the order
-    order.status = 'confirmed'
-    order.save()
+    if not _change_status(order, 'confirmed'):
+        return _status_conflict(order)
     
     serializer = OrderSerializer(order, context={'request': request})
     return Response({
@@ -241,7 +316,7 @@ def decline_order(request, order_id):
         return Response({'error': 'Order not found'}, status=status.HTTP_404_NOT_FOUND)
     
     # Check if user owns the store
-    if order.store.owner != request.user:
+    if order.store.owner_id != request.user.id:
         return Response({'error': 'You do not have permission to decline this order'}, 
                        status=status.HTTP_403_FORBIDDEN)
     
@@ -254,15 +329,85 @@ def decline_order(request, order_id):
     decline_reason = request.data.get('reason', '')
     
     # Decline the order
-    order.status = 'cancelled'
+    fields = {}
     if decline_reason:
         # Add reason to notes
         current_notes = order.notes or ''
-        order.notes = f"{current_notes}\n\nDeclined: {decline_reason}".strip()
-    order.save()
+        fields['notes'] = f"{current_notes}\n\nDeclined: {decline_reason}".strip()
+    if not _change_status(order, 'cancelled', **fields):
+        return _status_conflict(order)
     
     serializer = OrderSerializer(order, context={'request': request})
     return Response({
         'message': 'Order declined successfully',
         'order': serializer.data
-    })
\ No newline at end of file
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_update_order_status(request):
+    """Move many orders to a new status at once (store owner only)"""
+    serializer = BulkOrderStatusSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    order_ids = serializer.validated_data['order_ids']
+    new_status = serializer.validated_data['status']
+    source_statuses = Order.ALLOWED_TRANSITIONS[new_status]
+    
+    with transaction.atomic():
+        # Lock and inspect every requested order in a single query
+        current = {
+            order_id: (order_status, owner_id, store_id)
+            for order_id, order_status, owner_id, store_id in Order.objects.select_for_update(of=('self',))
+            .filter(id__in=order_ids)
+            .values_list('id', 'status', 'store__owner_id', 'store_id')
+        }
+        
+        results = []
+        allowed_ids = []
+        for order_id in order_ids:
+            if order_id not in current:
+                results.append({'id': order_id, 'result': 'not_found'})
+                continue
+            order_status, owner_id = current[order_id][:2]
+            if owner_id != request.user.id:
+                results.append({'id': order_id, 'result': 'permission_denied'})
+            elif order_status not in source_statuses:
+                results.append({'id': order_id, 'result': 'invalid_transition', 'status': order_status})
+            else:
+                results.append({'id': order_id, 'result': 'updated', 'status': new_status})
+                allowed_ids.append(order_id)
+        
+        updated = 0
+        if allowed_ids:
+            updated_at = timezone.now()
+            updated = Order.objects.filter(
+                id__in=allowed_ids, status__in=source_statuses
+            ).update(status=new_status, updated_at=updated_at)
+            if updated < len(allowed_ids):
+                # Without row locks an order can move on between the read and the update:
+                # only the rows this update changed get an event
+                changed = set(Order.objects.filter(
+                    id__in=allowed_ids, status=new_status, updated_at=updated_at
+                ).values_list('id', flat=True))
+                statuses = dict(Order.objects.filter(id__in=set(allowed_ids) - changed).values_list('id', 'status'))
+                for result in results:
+                    if result['result'] == 'updated' and result['id'] not in changed:
+                        if result['id'] in statuses:
+                            result.update(result='invalid_transition', status=statuses[result['id']])
+                        else:
+                            del result['status']
+                            result['result'] = 'not_found'
+                allowed_ids = [order_id for order_id in allowed_ids if order_id in changed]
+            record_status_changed(
+                [Order(id=order_id, store_id=current[order_id][2], status=new_status) for order_id in allowed_ids],
+                {order_id: current[order_id][0] for order_id in allowed_ids}
+            )
+    
+    return Response({
+        'message': f'{updated} order(s) updated to {new_status}',
+        'updated': updated,
+        'results': results
+    })
@@ -0,0 +1,152 @@
+import json
+import logging
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OrderEvent
+from .order_feed import get_broker
+
+
+logger = logging.getLogger('stores.outbox')
+
+# Claimed events are hidden from other workers for this long while being dispatched
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def _event_for(order, event_type, previous_status=None):
+    payload = {'order_id': order.id, 'status': order.status}
+    if previous_status is not None:
+        payload['previous_status'] = previous_status
+    return OrderEvent(event_type=event_type, store_id=order.store_id, order_id=order.id, payload=payload)
+
+
+def _record(events):
+    OrderEvent.objects.bulk_create(events)
+    # Wake live order feeds once the events are visible to other connections
+    for store_id in {event.store_id for event in events}:
+        transaction.on_commit(lambda store_id=store_id: get_broker().publish(store_id))
+
+
+def record_order_created(orders):
+    """Queue order.created events; call inside the transaction that created the orders"""
+    _record([_event_for(order, OrderEvent.CREATED) for order in orders])
+
+
+def record_status_changed(orders, previous_statuses):
+    """Queue order.status_changed events; previous_statuses maps order id -> old status"""
+    _record([_event_for(order, OrderEvent.STATUS_CHANGED, previous_statuses[order.id]) for order in orders])
+
+
+# Handlers
+
+def log_event(event):
+    """Write the event to the stores.outbox logger"""
+    logger.info('%s store=%s %s', event.event_type, event.store_id, json.dumps(event.payload))
+
+
+def email_event(event):
+    """Email the customer when their order is created or changes status"""
+    order = event.order
+    if order is None:
+        return
+    recipient = order.customer.email if order.customer_id else order.guest_email
+    if not recipient:
+        return
+    if event.event_type == OrderEvent.CREATED:
+        subject = f'Order #{order.id} received'
+    else:
+        subject = f'Order #{order.id} is now {event.payload["status"]}'
+    send_mail(subject, f'{subject} by {order.store.name}.', None, [recipient])
+
+
+def webhook_event(event):
+    """POST the event as JSON to ORDER_EVENT_WEBHOOK_URL"""
+    url = getattr(settings, 'ORDER_EVENT_WEBHOOK_URL', None)
+    if not url:
+        return
+    body = json.dumps({
+        'id': event.id,
+        'type': event.event_type,
+        'store_id': event.store_id,
+        'created_at': event.created_at.isoformat(),
+        'data': event.payload,
+    }).encode()
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        response.read()
+
+
+def get_handlers():
+    return [import_string(path) for path in getattr(settings, 'ORDER_EVENT_HANDLERS', ['stores.outbox.log_event'])]
+
+
+# Worker
+
+def claim_batch(batch_size):
+    """Lease up to batch_size due events so concurrent workers skip them"""
+    now = timezone.now()
+    with transaction.atomic():
+        due = OrderEvent.objects.filter(state='pending', available_at__lte=now).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = []
+        for event_id in due.values_list('id', flat=True)[:batch_size]:
+            # Without SKIP LOCKED another worker may have leased it since the scan
+            if OrderEvent.objects.filter(id=event_id, state='pending', available_at__lte=now).update(
+                    available_at=now + CLAIM_LEASE):
+                ids.append(event_id)
+    return list(OrderEvent.objects.filter(id__in=ids).select_related('order__customer', 'order__store').order_by('id'))
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'ORDER_EVENT_RETRY_BASE_SECONDS', 10)
+    return timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+def handler_name(handler):
+    return f'{handler.__module__}.{handler.__qualname__}'
+
+
+def dispatch(event, handlers):
+    """Run the handlers that haven't yet succeeded for one event and record the outcome"""
+    for handler in handlers:
+        name = handler_name(handler)
+        if name in event.completed_handlers:
+            continue
+        try:
+            handler(event)
+        except Exception as e:
+            event.attempts += 1
+            event.last_error = f'{name}: {e!r}'
+            if event.attempts >= getattr(settings, 'ORDER_EVENT_MAX_ATTEMPTS', 5):
+                event.state = 'failed'
+                logger.error('Giving up on %s after %s attempts: %s', event, event.attempts, event.last_error)
+            else:
+                event.available_at = timezone.now() + retry_delay(event.attempts)
+            event.save(update_fields=['attempts', 'last_error', 'state', 'available_at', 'completed_handlers'])
+            return False
+        event.completed_handlers.append(name)
+
+    event.attempts += 1
+    event.state = 'done'
+    event.processed_at = timezone.now()
+    event.save(update_fields=['attempts', 'state', 'processed_at', 'completed_handlers'])
+    return True
+
+
+def process_batch(batch_size=100, handlers=None):
+    """Drain one batch of due events, returning (succeeded, failed)"""
+    handlers = handlers if handlers is not None else get_handlers()
+    succeeded = failed = 0
+    for event in claim_batch(batch_size):
+        if dispatch(event, handlers):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
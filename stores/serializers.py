@@ -44,25 +44,26 @@ class StoreListSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
     
     def get_products_count(self, obj):
+        # Views annotate num_products to avoid a COUNT query per store
+        if hasattr(obj, 'num_products'):
+            return obj.num_products
         return obj.products.count()
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_name = serializers.CharField(source='product.name', read_only=True)
     product_image = serializers.SerializerMethodField()
-    product_description = serializers.CharField(source='product.description', read_only=True)
     
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'product_name', 'product_image', 'product_description', 'quantity', 'price']
-        read_only_fields = ['id']
+        read_only_fields = ['id', 'product_name', 'product_description']
     
     def get_product_image(self, obj):
-        if obj.product.image:
+        if obj.product_image:
             request = self.context.get('request')
             if request:
-                return request.build_absolute_uri(obj.product.image.url)
-            return obj.product.image.url
+                return request.build_absolute_uri(obj.product_image)
+            return obj.product_image
         return None
 
 
@@ -145,4 +146,15 @@ class CreateGuestOrderSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     "Guest email or name is required for non-authenticated users"
                 )
-        return attrs
\ No newline at end of file
+        return attrs
+
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=500
+    )
+    status = serializers.ChoiceField(choices=list(Order.ALLOWED_TRANSITIONS))
+    
+    def validate_order_ids(self, value):
+        # Preserve request order while dropping duplicates
+        return list(dict.fromkeys(value))
@@ -0,0 +1,48 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from storebuilder.cdn import schedule_purge
+from storebuilder.response_cache import schedule_invalidation
+
+from .models import Product, Store
+
+
+# Tags as listed in CACHE_TAGS: "stores" (store lists and their product counts), "products"
+# (the product list), "store-<id>" (a store and its products), "product-<id>", "owner-<id>"
+
+def invalidate(tags):
+    schedule_invalidation(tags)
+    schedule_purge(tags)
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_store(sender, instance, **kwargs):
+    # A product moved to another store must also disappear from the old store's pages
+    if not instance._state.adding:
+        instance._previous_store_id = Product.objects.filter(pk=instance.pk).values_list('store_id', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, instance, created=False, **kwargs):
+    tags = {f'product-{instance.pk}', f'store-{instance.store_id}', 'products'}
+    store_ids = {instance.store_id}
+    previous_store_id = getattr(instance, '_previous_store_id', None)
+    if previous_store_id and previous_store_id != instance.store_id:
+        store_ids.add(previous_store_id)
+    if created or kwargs['signal'] is post_delete or len(store_ids) > 1:
+        # Product counts changed
+        tags |= {f'store-{store_id}' for store_id in store_ids} | {'stores'}
+        # When a store (or its owner) is being deleted, its own signal covers the owner
+        origin = kwargs.get('origin')
+        cascaded = origin is not None and not isinstance(origin, Product) and getattr(origin, 'model', None) is not Product
+        if not cascaded:
+            owner_ids = Store.objects.filter(id__in=store_ids).values_list('owner_id', flat=True)
+            tags |= {f'owner-{owner_id}' for owner_id in owner_ids}
+    invalidate(tags)
+
+
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+def invalidate_store(sender, instance, **kwargs):
+    invalidate({f'store-{instance.pk}', f'owner-{instance.owner_id}', 'stores'})
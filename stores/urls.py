@@ -1,13 +1,16 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
 from .views import StoreViewSet, ProductViewSet, get_user_stores
 from .cart_views import (
     get_csrf_token, get_cart, add_to_cart, update_cart_item, remove_from_cart, 
     clear_cart, checkout, merge_cart
 )
+from .feed_views import order_events_feed
 from .order_views import (
     create_order, get_user_orders, get_store_orders, get_order_detail, update_order_status,
-    approve_order, decline_order
+    approve_order, decline_order, export_store_orders, bulk_update_order_status
 )
 
 router = DefaultRouter()
@@ -33,9 +36,30 @@ urlpatterns = [
     # Order endpoints
     path('orders/create/', create_order, name='create_order'),
     path('orders/user/', get_user_orders, name='get_user_orders'),
+    path('orders/bulk-status/', bulk_update_order_status, name='bulk_update_order_status'),
     path('orders/<int:order_id>/', get_order_detail, name='get_order_detail'),
     path('orders/<int:order_id>/status/', update_order_status, name='update_order_status'),
     path('orders/<int:order_id>/approve/', approve_order, name='approve_order'),
     path('orders/<int:order_id>/decline/', decline_order, name='decline_order'),
     path('store/<int:store_id>/orders/', get_store_orders, name='get_store_orders'),
-]
\ No newline at end of file
+    path('store/<int:store_id>/orders/events/', order_events_feed, name='order_events_feed'),
+    path('store/<int:store_id>/orders/export/', export_store_orders, name='export_store_orders'),
+]
+
+if settings.ASYNC_VIEWS:
+    # Under ASGI, serve the hot read endpoints with native async views
+    store_list = StoreViewSet.as_view({'get': 'list', 'post': 'create'})
+    store_detail = StoreViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'})
+    store_products = StoreViewSet.as_view({'get': 'products'})
+    product_list = ProductViewSet.as_view({'get': 'list', 'post': 'create'})
+    product_detail = ProductViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'})
+    
+    urlpatterns = [
+        path('stores/', async_views.read_view(async_views.store_list, store_list), name='store-list'),
+        path('stores/<int:pk>/', async_views.read_view(async_views.store_retrieve, store_detail), name='store-detail'),
+        path('stores/<int:pk>/products/', async_views.read_view(async_views.store_products, store_products), name='store-products'),
+        path('products/', async_views.read_view(async_views.product_list, product_list), name='product-list'),
+        path('products/<int:pk>/', async_views.read_view(async_views.product_retrieve, product_detail), name='product-detail'),
+        path('user/<int:user_id>/stores/', async_views.read_view(async_views.get_user_stores, get_user_stores), name='get_user_stores'),
+        path('cart/', async_views.read_view(async_views.get_cart, get_cart), name='get_cart'),
+    ] + urlpatterns
@@ -1,6 +1,7 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view, permission_classes
+from django.db.models import Count
 from django.shortcuts import get_object_or_404
 from .models import Store, Product, Order, OrderItem
 from .serializers import (StoreSerializer, StoreListSerializer, ProductSerializer, 
@@ -23,12 +24,14 @@ class StoreViewSet(viewsets.ModelViewSet):
         return StoreSerializer
     
     def get_queryset(self):
-        if self.action in ['list', 'retrieve', 'products']:
+        if self.action == 'list':
+            return Store.objects.annotate(num_products=Count('products'))
+        if self.action in ['retrieve', 'products']:
             return Store.objects.all()
-        return Store.objects.filter(owner=self.request.user)
+        return Store.objects.filter(owner_id=self.request.user.id)
     
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        serializer.save(owner_id=self.request.user.id)
     
     @action(detail=True, methods=['get'])
     def products(self, request, pk=None):
@@ -55,17 +58,17 @@ class ProductViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         if self.action in ['list', 'retrieve']:
             return Product.objects.all()
-        return Product.objects.filter(store__owner=self.request.user)
+        return Product.objects.filter(store__owner_id=self.request.user.id)
     
     def perform_create(self, serializer):
         store_id = self.request.data.get('store')
-        store = get_object_or_404(Store, id=store_id, owner=self.request.user)
+        store = get_object_or_404(Store, id=store_id, owner_id=self.request.user.id)
         serializer.save(store=store)
     
     def perform_update(self, serializer):
         store_id = self.request.data.get('store')
         if store_id:
-            store = get_object_or_404(Store, id=store_id, owner=self.request.user)
+            store = get_object_or_404(Store, id=store_id, owner_id=self.request.user.id)
             serializer.save(store=store)
         else:
             serializer.save()
@@ -81,7 +84,7 @@ def create_order(request, store_id):
     
     serializer = OrderCreateSerializer(data=request.data)
     if serializer.is_valid():
-        order = serializer.save(customer=request.user, store=store)
+        order = serializer.save(customer_id=request.user.id, store=store)
         return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -95,7 +98,7 @@ def get_store_orders(request, store_id):
         return Response({'error': 'Store not found'}, status=status.HTTP_404_NOT_FOUND)
     
     # Only store owner can view orders
-    if store.owner != request.user:
+    if store.owner_id != request.user.id:
         return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
     
     orders = Order.objects.filter(store=store).order_by('-created_at')
@@ -112,6 +115,6 @@ def get_user_stores(request, user_id):
     except User.DoesNotExist:
         return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    stores = Store.objects.filter(owner=user).order_by('name')
+    stores = Store.objects.filter(owner=user).annotate(num_products=Count('products')).order_by('name')
     serializer = StoreListSerializer(stores, many=True, context={'request': request})
     return Response(serializer.data)
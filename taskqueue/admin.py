@@ -0,0 +1,19 @@
+from django.contrib import admin
+from storebuilder.pagination import EstimatedCountPaginator
+from .models import Task, Worker
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'state', 'priority', 'attempts', 'available_at', 'worker', 'created_at']
+    list_filter = ['state']
+    search_fields = ['^name']
+    readonly_fields = ['attempts', 'slot', 'worker', 'last_error', 'created_at', 'started_at', 'finished_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Worker)
+class WorkerAdmin(admin.ModelAdmin):
+    list_display = ['name', 'hostname', 'pid', 'task', 'processed', 'failed', 'last_seen']
+    readonly_fields = ['name', 'hostname', 'pid', 'task', 'processed', 'failed', 'started_at', 'last_seen']
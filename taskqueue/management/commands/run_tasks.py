@@ -0,0 +1,47 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from taskqueue.queue import TaskWorker, prune
+
+
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = ('Run queued tasks (taskqueue.queue.enqueue) until stopped. Start as many as needed, on one '
+            'machine or several; SIGTERM or Ctrl-C finishes the current task first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to sleep when no task is due')
+        parser.add_argument('--once', action='store_true', help='Run until no task is due, then exit')
+        parser.add_argument('--max-tasks', type=int, default=0,
+                            help='Exit after this many tasks, for a supervisor to restart the worker')
+        parser.add_argument('--name', help='Worker name (default: host:pid:random)')
+
+    def handle(self, *args, **options):
+        worker = TaskWorker(options['name'])
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: worker.stop())
+        worker.start()
+        self.stdout.write(f'Worker {worker.name} started')
+        last_prune = 0
+        try:
+            while not worker.stopping.is_set():
+                if worker.run_one():
+                    if options['max_tasks'] and worker.processed >= options['max_tasks']:
+                        break
+                    continue
+                if options['once']:
+                    break
+                if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                    tasks, workers = prune()
+                    last_prune = time.monotonic()
+                    if tasks or workers:
+                        self.stdout.write(f'Pruned {tasks} old task(s), {workers} silent worker(s)')
+                worker.stopping.wait(options['interval'])
+        finally:
+            worker.shutdown()
+        self.stdout.write(f'Worker {worker.name} stopped: {worker.processed} task(s), {worker.failed} failed')
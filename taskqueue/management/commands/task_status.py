@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from taskqueue.queue import queue_stats, worker_health
+
+
+class Command(BaseCommand):
+    help = ('Show queued tasks by state and the health of run_tasks workers. With --check, exit non-zero '
+            'when no worker is alive or due tasks have waited longer than --max-wait, for health checks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true')
+        parser.add_argument('--max-wait', type=float, default=300, help='Seconds (with --check)')
+
+    def handle(self, *args, **options):
+        stats = queue_stats()
+        self.stdout.write(f'{"task":<50} {"pending":>8} {"running":>8} {"done":>8} {"failed":>8}')
+        for name, counts in sorted(stats['counts'].items()):
+            self.stdout.write(f'{name:<50} ' + ' '.join(
+                f'{counts.get(state, 0):>8}' for state in ('pending', 'running', 'done', 'failed')))
+        self.stdout.write(f'Oldest due task waiting: {stats["oldest_due_seconds"]:.0f}s')
+
+        health = worker_health()
+        for worker, silence, alive in health:
+            current = worker.task.name if worker.task else 'idle'
+            self.stdout.write(f'{worker.name}: {"alive" if alive else "SILENT"} (seen {silence:.0f}s ago), '
+                              f'{worker.processed} processed, {worker.failed} failed, {current}')
+
+        if options['check']:
+            if not any(alive for _, _, alive in health):
+                raise CommandError('No live task worker')
+            if stats['oldest_due_seconds'] > options['max_wait']:
+                raise CommandError(f'Due tasks waiting {stats["oldest_due_seconds"]:.0f}s')
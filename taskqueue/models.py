@@ -0,0 +1,63 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """One call of a task function, queued until a worker (manage.py run_tasks) runs it"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATE_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200, help_text='Dotted path of the task function')
+    kwargs = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0, help_text='Higher runs first')
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Pending: not before this. Running: the worker's lease, extended by its heartbeat
+    available_at = models.DateTimeField(default=timezone.now)
+    # Concurrency slot of a running task whose type has a limit
+    slot = models.PositiveSmallIntegerField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['state', 'available_at'])]
+        constraints = [
+            # Enforces TASK_TYPES concurrency limits across workers
+            models.UniqueConstraint(fields=['name', 'slot'], condition=Q(state='running'),
+                                    name='taskqueue_task_running_slot'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.state})"
+
+
+class Worker(models.Model):
+    """A run_tasks process, reporting in every TASK_HEARTBEAT_SECONDS"""
+    name = models.CharField(max_length=100, unique=True)
+    hostname = models.CharField(max_length=255)
+    pid = models.PositiveIntegerField()
+    task = models.ForeignKey(Task, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    processed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,251 @@
+"""
+Database-backed task queue.
+
+``enqueue()`` stores a call of a task function (any importable function taking
+JSON-serialisable keyword arguments) as a ``Task`` row, in the caller's
+transaction, so a task queued by a request that then fails is never run.
+``manage.py run_tasks`` workers claim due tasks by priority and run them; no
+broker or extra service is involved.
+
+Claiming locks candidate rows with ``SELECT ... FOR UPDATE SKIP LOCKED`` where
+the database supports it (Postgres), so workers don't queue behind each other.
+Elsewhere (SQLite) the claim is a conditional UPDATE that only succeeds while
+the row is still claimable, so two workers can't both win a task either way.
+
+A claimed task is leased to its worker for TASK_LEASE_SECONDS and the worker's
+heartbeat keeps extending it; a task whose worker died is claimed again once
+the lease runs out. Failed tasks are retried with exponential backoff up to
+max_attempts. ``TASK_TYPES`` sets per-task-function defaults, including a
+``concurrency`` limit enforced by the database: running tasks of a limited
+type each hold one of its numbered slots.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task, Worker
+
+
+logger = logging.getLogger('taskqueue')
+
+# Candidates examined per claim, so a type at its concurrency limit doesn't block the rest
+CLAIM_SCAN = 20
+
+
+def task_options(name):
+    options = getattr(settings, 'TASK_TYPES', {}).get(name, {})
+    return {
+        'priority': options.get('priority', 0),
+        'max_attempts': options.get('max_attempts', getattr(settings, 'TASK_MAX_ATTEMPTS', 5)),
+        'concurrency': options.get('concurrency'),
+    }
+
+
+def enqueue(func, kwargs=None, *, priority=None, delay=None, run_at=None, max_attempts=None):
+    """
+    Queue func(**kwargs). func is a function or its dotted path; delay (seconds
+    or timedelta) or run_at holds the task back. Returns the Task.
+    """
+    name = func if isinstance(func, str) else f'{func.__module__}.{func.__qualname__}'
+    # Fail at the call site on a typo rather than in a worker later
+    import_string(name)
+    options = task_options(name)
+    if run_at is None:
+        run_at = timezone.now()
+        if delay:
+            run_at += delay if isinstance(delay, timedelta) else timedelta(seconds=delay)
+    return Task.objects.create(
+        name=name, kwargs=kwargs or {}, available_at=run_at,
+        priority=options['priority'] if priority is None else priority,
+        max_attempts=options['max_attempts'] if max_attempts is None else max_attempts,
+    )
+
+
+def lease():
+    return timedelta(seconds=getattr(settings, 'TASK_LEASE_SECONDS', 60))
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'TASK_RETRY_BASE_SECONDS', 10)
+    # Jitter spreads out retries of tasks that failed together
+    return timedelta(seconds=base * 2 ** (attempts - 1) * random.uniform(0.8, 1.2))
+
+
+def free_slot(name, limit):
+    used = set(Task.objects.filter(name=name, state=Task.RUNNING).values_list('slot', flat=True))
+    return next((slot for slot in range(limit) if slot not in used), None)
+
+
+def claim(worker_name):
+    """Lease the most urgent due task to worker_name; None if there's nothing to run"""
+    now = timezone.now()
+    with transaction.atomic():
+        # Running tasks past their lease lost their worker
+        due = (Task.objects.filter(state__in=[Task.PENDING, Task.RUNNING], available_at__lte=now)
+               .order_by('-priority', 'available_at', 'id'))
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        full = set()
+        for task in due[:CLAIM_SCAN]:
+            if task.name in full:
+                continue
+            # A reclaimed task keeps its slot
+            slot = task.slot
+            limit = task_options(task.name)['concurrency']
+            if limit and slot is None:
+                slot = free_slot(task.name, limit)
+                if slot is None:
+                    full.add(task.name)
+                    continue
+            try:
+                with transaction.atomic():
+                    claimed = Task.objects.filter(id=task.id, state=task.state, available_at__lte=now).update(
+                        state=Task.RUNNING, slot=slot, worker=worker_name, attempts=F('attempts') + 1,
+                        available_at=now + lease(), started_at=now,
+                    )
+            except IntegrityError:
+                # Another worker took the last slot meanwhile
+                full.add(task.name)
+                continue
+            if claimed:
+                task.refresh_from_db()
+                return task
+    return None
+
+
+def _finish(task, worker_name, **fields):
+    # Only while still ours: after a lost lease another worker owns the row
+    return Task.objects.filter(id=task.id, state=Task.RUNNING, worker=worker_name).update(
+        slot=None, last_error=task.last_error, **fields)
+
+
+def run(task, worker_name):
+    """Run a claimed task and record the outcome; returns True on success"""
+    if task.attempts > task.max_attempts:
+        # Its workers kept dying mid-task
+        task.last_error = task.last_error or 'Lease expired'
+        _finish(task, worker_name, state=Task.FAILED, finished_at=timezone.now())
+        logger.error('Giving up on %s #%s after %s attempts: lease expired', task.name, task.id, task.max_attempts)
+        return False
+    try:
+        import_string(task.name)(**task.kwargs)
+    except Exception as e:
+        task.last_error = repr(e)
+        if task.attempts >= task.max_attempts:
+            _finish(task, worker_name, state=Task.FAILED, finished_at=timezone.now())
+            logger.error('Giving up on %s #%s after %s attempts: %r', task.name, task.id, task.attempts, e)
+        else:
+            _finish(task, worker_name, state=Task.PENDING, worker='',
+                    available_at=timezone.now() + retry_delay(task.attempts))
+            logger.warning('%s #%s failed (attempt %s of %s): %r', task.name, task.id, task.attempts, task.max_attempts, e)
+        return False
+    _finish(task, worker_name, state=Task.DONE, finished_at=timezone.now())
+    return True
+
+
+# Workers
+
+class TaskWorker:
+    """Claims and runs tasks one at a time, with a heartbeat thread reporting in and extending the lease"""
+
+    def __init__(self, name=None):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self.stopping = threading.Event()
+        self.current = None
+        self.processed = self.failed = 0
+
+    def start(self):
+        Worker.objects.update_or_create(name=self.name, defaults={
+            'hostname': socket.gethostname(), 'pid': os.getpid(), 'last_seen': timezone.now(),
+        })
+        self.heartbeat_thread = threading.Thread(target=self.heartbeat, daemon=True)
+        self.heartbeat_thread.start()
+
+    def stop(self):
+        self.stopping.set()
+
+    def heartbeat(self):
+        interval = getattr(settings, 'TASK_HEARTBEAT_SECONDS', 10)
+        try:
+            while not self.stopping.wait(interval):
+                now = timezone.now()
+                current = self.current
+                Worker.objects.filter(name=self.name).update(
+                    last_seen=now, task_id=current.id if current else None,
+                    processed=self.processed, failed=self.failed,
+                )
+                if current is not None:
+                    Task.objects.filter(id=current.id, state=Task.RUNNING, worker=self.name).update(
+                        available_at=now + lease())
+        except Exception:
+            logger.exception('Heartbeat of %s failed', self.name)
+        finally:
+            connection.close()
+
+    def run_one(self):
+        """Claim and run one task; False when nothing was due"""
+        close_old_connections()
+        task = claim(self.name)
+        if task is None:
+            return False
+        self.current = task
+        started = time.monotonic()
+        try:
+            succeeded = run(task, self.name)
+        finally:
+            self.current = None
+        self.processed += 1
+        self.failed += not succeeded
+        logger.info('%s #%s %s in %.0f ms', task.name, task.id, 'done' if succeeded else 'failed',
+                    (time.monotonic() - started) * 1000)
+        return True
+
+    def shutdown(self):
+        self.stopping.set()
+        Worker.objects.filter(name=self.name).delete()
+
+
+def prune():
+    """Delete finished tasks past TASK_RETENTION_DAYS and workers gone silent for a day"""
+    now = timezone.now()
+    cutoff = now - timedelta(days=getattr(settings, 'TASK_RETENTION_DAYS', 7))
+    tasks, _ = Task.objects.filter(state__in=[Task.DONE, Task.FAILED], finished_at__lt=cutoff).delete()
+    workers, _ = Worker.objects.filter(last_seen__lt=now - timedelta(days=1)).delete()
+    return tasks, workers
+
+
+def queue_stats():
+    """Counts by task name and state, plus how long the oldest due task has been waiting"""
+    now = timezone.now()
+    counts = {}
+    for row in Task.objects.values('name', 'state').annotate(count=Count('id')).order_by():
+        counts.setdefault(row['name'], {})[row['state']] = row['count']
+    oldest = Task.objects.filter(state=Task.PENDING, available_at__lte=now).aggregate(Min('available_at'))
+    oldest = oldest['available_at__min']
+    return {
+        'counts': counts,
+        'oldest_due_seconds': (now - oldest).total_seconds() if oldest else 0,
+    }
+
+
+def worker_health():
+    """(worker, seconds since last heartbeat, alive) for every registered worker"""
+    now = timezone.now()
+    # Three missed heartbeats and a worker counts as gone
+    limit = 3 * getattr(settings, 'TASK_HEARTBEAT_SECONDS', 10)
+    health = []
+    for worker in Worker.objects.select_related('task'):
+        silence = (now - worker.last_seen).total_seconds()
+        health.append((worker, silence, silence <= limit))
+    return health